@@ -1,28 +1,84 @@
-
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncIterator
 
 from psycopg import AsyncConnection
 from psycopg.rows import DictRow
 
 if TYPE_CHECKING:
     from app.internal.IRIS.data_access_layer.iris_dal_main import IrisDataAccessLayer
-    from app.internal.IRIS.iris_db_connection import IrisAsyncConnection
+    from app.internal.IRIS.iris_db_connection import IrisAsyncConnectionPool
     from app.internal.IRIS.iris_queries_wrapper import Iris
 
-iris_aconn : AsyncConnection[DictRow] | None = None
+iris_pool : IrisAsyncConnectionPool | None = None
+iris_read_pool : IrisAsyncConnectionPool | None = None
 iris_dal : IrisDataAccessLayer | None = None
 iris_query_wrapper : Iris | None = None
 
-async def init_global_aconn(conn: IrisAsyncConnection):
-    """ Initialize global IRIS database connection
+# Connections checked out by the current request / task, shared by every DAL call it makes
+iris_aconn : ContextVar[AsyncConnection[DictRow] | None] = ContextVar(
+    "iris_aconn", default=None
+)
+iris_read_aconn : ContextVar[AsyncConnection[DictRow] | None] = ContextVar(
+    "iris_read_aconn", default=None
+)
+
+async def init_global_pool(pool: IrisAsyncConnectionPool):
+    """ Initialize global IRIS database connection pool
+
+    Args:
+        pool (IrisAsyncConnectionPool): IRIS psycopg database connection pool object
+    """
+    global iris_pool # pylint: disable=global-statement
+    iris_pool = pool
+
+async def init_global_read_pool(pool: IrisAsyncConnectionPool):
+    """ Initialize global IRIS read-only database connection pool
 
     Args:
-        conn (IrisAsyncConnection): IRIS psycopg database connection object
+        pool (IrisAsyncConnectionPool): IRIS psycopg read-only connection pool object
     """
-    global iris_aconn # pylint: disable=global-statement
-    iris_aconn = conn.get_conn()
-    
+    global iris_read_pool # pylint: disable=global-statement
+    iris_read_pool = pool
+
+@asynccontextmanager
+async def _checkout(
+    pool: IrisAsyncConnectionPool, context: ContextVar
+) -> AsyncIterator[AsyncConnection[DictRow]]:
+    aconn = context.get()
+    if aconn is not None:
+        yield aconn
+        return
+
+    async with pool.get_pool().connection() as aconn:
+        token = context.set(aconn)
+        try:
+            yield aconn
+        finally:
+            context.reset(token)
+
+def iris_connection():
+    """ Get the IRIS connection of the current context, or check out one from
+        the pool for the duration of the block if none is held yet
+
+    Returns:
+        AsyncContextManager[AsyncConnection[DictRow]]: IRIS psycopg database connection
+    """
+    return _checkout(iris_pool, iris_aconn)
+
+def iris_read_connection():
+    """ Get a connection to the read-only IRIS pool. Falls back on the primary
+        connection when the current context already holds one, so a writer
+        always reads its own writes.
+
+    Returns:
+        AsyncContextManager[AsyncConnection[DictRow]]: IRIS psycopg database connection
+    """
+    if iris_aconn.get() is not None:
+        return _checkout(iris_pool, iris_aconn)
+    return _checkout(iris_read_pool, iris_read_aconn)
+
 async def init_global_iris_dal(dal : IrisDataAccessLayer):
     """ Initialize global IRIS Data Access Layer
 
@@ -39,4 +95,4 @@ async def init_global_iris_query_wrapper(wrapper : Iris):
         wrapper (Iris): IRIS API queries wrapper object
     """
     global iris_query_wrapper  # pylint: disable=global-statement
-    iris_query_wrapper = wrapper
\ No newline at end of file
+    iris_query_wrapper = wrapper
@@ -214,7 +214,9 @@ class Wizard:
         await connectors.iris_query_wrapper.push_new_game(game_data_res, game_existence)
 
     async def get_matching_videos(self):
-        game_data = await connectors.iris_query_wrapper.get_base_game_data(self.game_id)
+        # Read from the primary, the game may have just been pushed and not be replicated yet
+        async with connectors.iris_connection():
+            game_data = await connectors.iris_query_wrapper.get_base_game_data(self.game_id)
         self.game_name = game_data.get("name")
         release_date: datetime.date = game_data.get("first_release_date")
 
@@ -8,6 +8,32 @@ from app.internal.IGDB.igdb_utils import detect_year_in_name
 
 from app.utils.loggers import base_logger as logger
 
+# Maximum number of results of an IGDB API query
+IGDB_MAX_LIMIT = 500
+
+# Game fields pushed to IRIS (see IGDB_IRIS_association.json)
+GAME_DATA_FIELDS = """fields name,
+    alternative_names.name, alternative_names.comment,
+    artworks.alpha_channel, artworks.animated, artworks.height, artworks.width, artworks.image_id,
+    category,
+    cover.alpha_channel, cover.animated, cover.height, cover.width, cover.image_id,
+    collection.name, collection.slug,
+    dlcs.name,
+    expanded_games.name,
+    expansions.name,
+    first_release_date,
+    genres.name, genres.slug,
+    involved_companies.company, involved_companies.developer, involved_companies.porting, involved_companies.publisher, involved_companies.supporting,
+    keywords.name, keywords.slug,
+    parent_game.name,
+    rating,
+    screenshots.alpha_channel, screenshots.animated, screenshots.height, screenshots.width, screenshots.image_id,
+    similar_games.name,
+    slug,
+    standalone_expansions.name,
+    summary,
+    themes.name, themes.slug;"""
+
 
 class IGDB:
     """IGDB related functions"""
@@ -81,33 +107,36 @@ class IGDB:
             dict: Game data
         """
 
-        data = f"""fields name,
-                        alternative_names.name, alternative_names.comment, 
-                        artworks.alpha_channel, artworks.animated, artworks.height, artworks.width, artworks.image_id, 
-                        category, 
-                        cover.alpha_channel, cover.animated, cover.height, cover.width, cover.image_id, 
-                        collection.name, collection.slug, 
-                        dlcs.name, 
-                        expanded_games.name, 
-                        expansions.name, 
-                        first_release_date,  
-                        genres.name, genres.slug,
-                        involved_companies.company, involved_companies.developer, involved_companies.porting, involved_companies.publisher, involved_companies.supporting, 
-                        keywords.name, keywords.slug, 
-                        parent_game.name,
-                        rating, 
-                        screenshots.alpha_channel, screenshots.animated, screenshots.height, screenshots.width, screenshots.image_id,
-                        similar_games.name, 
-                        slug, 
-                        standalone_expansions.name, 
-                        summary, 
-                        themes.name, themes.slug; 
+        data = f"""{GAME_DATA_FIELDS}
                         where id={gameID};"""
 
         parsed_igdb_res = await self.igdb_request.get("games", data)
 
         return parsed_igdb_res
 
+    async def get_games_data(self, game_ids: list[int]) -> list[dict]:
+        """Get the data of several games from IGDB API, up to IGDB_MAX_LIMIT games
+            per request
+
+        Args:
+            game_ids (list[int]): Game IDs
+
+        Returns:
+            list[dict]: Data of the games found, in no particular order
+        """
+
+        games_data = []
+        for start in range(0, len(game_ids), IGDB_MAX_LIMIT):
+            chunk = ",".join(
+                str(game_id) for game_id in game_ids[start : start + IGDB_MAX_LIMIT]
+            )
+            data = f"""{GAME_DATA_FIELDS}
+                        where id=({chunk}); limit {IGDB_MAX_LIMIT};"""
+
+            games_data += await self.igdb_request.get("games", data)
+
+        return games_data
+
     async def get_companies(self, field_data: list) -> list:
         """Get company data from IGDB API
 
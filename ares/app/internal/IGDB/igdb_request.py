@@ -1,95 +1,311 @@
+import copy
+import hashlib
+import math
 import random
 import os
+import time
 import httpx
 import asyncio
 
 from app.utils.loggers import base_logger as logger
 
-from app.utils.connection import REDIS_GLOBAL
+from app.utils.connection import REDIS_ASYNC
+from app.internal.utilities.cache import IrisCache
 from app.internal.utilities.json import unload_json
+from app.internal.utilities.rate_limiter import TokenBucket
 
 from app.internal.errors.igdb_exceptions import (
     IGDBInvalidReponseCode,
     IGDBInvalidReponse,
+    IGDBTokenError,
 )
 
 from app.internal.Youtube.youtube_const import PROXIES
 
+# IGDB allows 4 requests per second and 8 open requests per client
+IGDB_REQUESTS_PER_SECOND = float(os.getenv("IGDB_REQUESTS_PER_SECOND", "4"))
+IGDB_MAX_CONCURRENT_REQUESTS = 8
+# Retries of a request rejected with 429 Too Many Requests
+IGDB_MAX_RETRIES = 4
+
+IGDB_API_URL = "https://api.igdb.com/v4/"
+IGDB_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+IGDB_TOKEN_KEY = "IGDB_TOKEN"
+# The token is renewed in the background when it expires in less than this (seconds)
+IGDB_TOKEN_REFRESH_MARGIN = int(os.getenv("IGDB_TOKEN_REFRESH_MARGIN", "3600"))
+# Seconds before a failed background renewal is retried, while the current token is still valid
+IGDB_TOKEN_RETRY_DELAY = int(os.getenv("IGDB_TOKEN_RETRY_DELAY", "60"))
+# IGDB responses cache, entries live IGDB_CACHE_TTL[endpoint] seconds in Redis
+IGDB_CACHE_ENABLED = os.getenv("IGDB_CACHE_ENABLED", "true").lower() == "true"
+IGDB_CACHE_DEFAULT_TTL = 24 * 3600
+IGDB_CACHE_TTL = {
+    "games": 7 * 24 * 3600,
+    "companies": 30 * 24 * 3600,
+}
+IGDB_CACHE_LOCAL_MAX_BYTES = 16 * 1024 * 1024
+
+IGDB_API_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=8, keepalive_expiry=60)
+IGDB_IMAGES_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=16, keepalive_expiry=60)
+
 
 class IGDB_Request:
     def __init__(self):
-        self.token = self.get_igdb_token()
-        if not self.token:
-            print("Erreur lors de la récupération du token.")
-            return None
+        # Long-lived HTTP/2 clients, opened with the app (see open_clients)
+        self.api_client: httpx.AsyncClient | None = None
+        self.image_clients: list[httpx.AsyncClient] = []
+
+        # Shared by every caller (wizards, bulk creation workers...) of this client
+        self.rate_limiter = TokenBucket(
+            IGDB_REQUESTS_PER_SECOND, max(1, int(IGDB_REQUESTS_PER_SECOND))
+        )
+        self.concurrency = asyncio.Semaphore(IGDB_MAX_CONCURRENT_REQUESTS)
+        # In-flight API requests by (endpoint, normalized body), shared by identical calls
+        self.in_flight: dict[str, asyncio.Task] = {}
+        # Shared by the workers, entries of a given endpoint are tagged "igdb:<endpoint>"
+        self.cache = IrisCache(
+            REDIS_ASYNC, prefix="igdb:cache", local_max_bytes=IGDB_CACHE_LOCAL_MAX_BYTES
+        )
+
+        # Access token, fetched on first use (see get_headers)
+        self.token: str | None = None
+        self.token_expires_at = 0.0
+        self.token_task: asyncio.Task | None = None
+        self.token_failed_at = -math.inf
+
+    async def get_headers(self) -> dict:
+        """Get the IGDB request headers, fetching the access token if needed.
+            A token close to its expiry is renewed in the background while the
+            current one keeps being used, at most every IGDB_TOKEN_RETRY_DELAY
+            seconds if renewals fail.
 
-        self.req_header = {
+        Raises:
+            IGDBTokenError: No valid token could be obtained
+
+        Returns:
+            dict: Request headers
+        """
+        now = time.monotonic()
+        remaining = self.token_expires_at - now
+
+        if self.token is None or remaining <= 0:
+            await self.load_token()
+        elif (
+            remaining < IGDB_TOKEN_REFRESH_MARGIN
+            and self.token_task is None
+            and now - self.token_failed_at >= IGDB_TOKEN_RETRY_DELAY
+        ):
+            self.start_token_task(renew=True)
+
+        return {
             "Accept": "application/json",
             "Client-ID": os.getenv("IGDB_ID"),
             "Authorization": f"Bearer {self.token}",
         }
 
-    def get_igdb_token(self):
-        token = REDIS_GLOBAL.get("IGDB_TOKEN")
+    async def load_token(self, renew: bool = False) -> None:
+        """Wait for the token to be loaded. Concurrent callers share a single
+            load instead of each requesting a new token.
 
-        if not token:
-            token = self.refresh_igdb_token()
+        Args:
+            renew (bool, optional): Ignore the current token. Defaults to False.
+        """
+        task = self.token_task or self.start_token_task(renew)
+        await asyncio.shield(task)
 
-        token = token[0]
-        # Test if token is still valid
-        headers = {
-            "Client-ID": os.getenv("IGDB_ID"),
-            "Authorization": f"Bearer {token}",
-        }
-        response = httpx.get(
-            "https://api.igdb.com/v4/games", headers=headers, timeout=10
-        )
+    def start_token_task(self, renew: bool) -> asyncio.Task:
+        self.token_task = asyncio.ensure_future(self.fetch_token(renew))
+        self.token_task.add_done_callback(self.token_task_done)
+        return self.token_task
+
+    def token_task_done(self, task: asyncio.Task) -> None:
+        self.token_task = None
+        # Retrieve the error of background renewals, callers awaiting the task get it too
+        if not task.cancelled() and task.exception() is not None:
+            self.token_failed_at = time.monotonic()
+            logger.error("Error while refreshing IGDB token: %s", task.exception())
+
+    async def fetch_token(self, renew: bool) -> None:
+        """Load the token shared by the workers in Redis, or request a new one
+            from Twitch if it is missing, expiring or rejected.
 
-        if response.status_code != 200:
-            token = self.refresh_igdb_token()
+        Args:
+            renew (bool): The current token is rejected or about to expire
+
+        Raises:
+            IGDBTokenError: Twitch did not deliver a token
+        """
+        token, ttl = await asyncio.gather(
+            REDIS_ASYNC.get(IGDB_TOKEN_KEY), REDIS_ASYNC.ttl(IGDB_TOKEN_KEY)
+        )
+        token = token.decode() if token else None
 
-        return token
+        # Another worker may already have renewed it
+        if token and not (renew and token == self.token):
+            # Tokens stored without expiry are kept until IGDB rejects them
+            if ttl < 0 or ttl > IGDB_TOKEN_REFRESH_MARGIN:
+                self.set_token(token, ttl if ttl >= 0 else math.inf)
+                return
 
-    def refresh_igdb_token(self):
         logger.info("Refreshing IGDB token.")
         try:
-            response = httpx.post(
-                "https://id.twitch.tv/oauth2/token",
-                data={
-                    "client_id": os.getenv("IGDB_ID"),
-                    "client_secret": os.getenv("IGDB_SECRET"),
-                    "grant_type": "client_credentials",
-                },
-                timeout=10,
-            )
-
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(
+                    IGDB_TOKEN_URL,
+                    data={
+                        "client_id": os.getenv("IGDB_ID"),
+                        "client_secret": os.getenv("IGDB_SECRET"),
+                        "grant_type": "client_credentials",
+                    },
+                )
             response.raise_for_status()
             data = response.json()
-            REDIS_GLOBAL.set("IGDB_TOKEN", data["access_token"])
-
-            return data["access_token"]
-        except httpx.HTTPError as e:
-            logger.error("Error while refreshing IGDB token: %s", e)
-            return None
-
-    async def get(self, endpoint: str, data: str):
-        async with httpx.AsyncClient() as client:
-            IGDB_res = await client.post(
-                f"https://api.igdb.com/v4/{endpoint}",
-                headers=self.req_header,
-                data=data,
-                timeout=10,
+            token, expires_in = data["access_token"], int(data["expires_in"])
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            raise IGDBTokenError(f"Unable to get an IGDB access token: {e}") from e
+
+        await REDIS_ASYNC.set(IGDB_TOKEN_KEY, token, ex=expires_in)
+        self.set_token(token, expires_in)
+
+    def set_token(self, token: str, expires_in: float) -> None:
+        self.token = token
+        self.token_expires_at = time.monotonic() + expires_in
+
+    def open_clients(self) -> None:
+        """Open the keep-alive HTTP/2 clients: one for the API, one per proxy for
+            the images. Connections are then reused across requests instead of
+            paying a TCP + TLS handshake each time.
+        """
+        if self.api_client is not None:
+            return
+
+        self.api_client = httpx.AsyncClient(
+            base_url=IGDB_API_URL, http2=True, limits=IGDB_API_LIMITS, timeout=10
+        )
+        self.image_clients = [
+            httpx.AsyncClient(
+                proxy=proxy, http2=True, limits=IGDB_IMAGES_LIMITS, timeout=10
             )
+            for proxy in PROXIES
+        ]
+
+    async def close_clients(self) -> None:
+        """Close the HTTP clients and their connections"""
+        if self.api_client is None:
+            return
+
+        await self.api_client.aclose()
+        for client in self.image_clients:
+            await client.aclose()
+
+        self.api_client = None
+        self.image_clients = []
+
+    def make_cache_key(self, endpoint: str, data: str) -> str:
+        """Build the cache key of a query from its endpoint and its body with
+            whitespace normalized
+
+        Args:
+            endpoint (str): API endpoint (e.g. games)
+            data (str): Apicalypse query
+
+        Returns:
+            str: Cache key
+        """
+        body = " ".join(data.split())
+        return self.cache.make_key(endpoint, hashlib.sha256(body.encode()).hexdigest())
+
+    async def get(self, endpoint: str, data: str, cache: bool = True):
+        """Query the IGDB API. Responses are cached by query, and identical
+            queries already in flight are not sent again, their callers share
+            the same response.
+
+        Args:
+            endpoint (str): API endpoint (e.g. games)
+            data (str): Apicalypse query
+            cache (bool, optional): Read the response from cache. A bypassed
+                query still refreshes its cache entry. Defaults to True.
+
+        Raises:
+            IGDBInvalidReponseCode: IGDB answered with an error code
+            IGDBInvalidReponse: IGDB answer is not valid JSON
 
-            if IGDB_res.status_code != 200:
-                raise IGDBInvalidReponseCode(IGDB_res.status_code)
+        Returns:
+            list: Parsed response
+        """
+        key = self.make_cache_key(endpoint, data)
+        ttl = IGDB_CACHE_TTL.get(endpoint, IGDB_CACHE_DEFAULT_TTL)
+        tags = [f"igdb:{endpoint}"]
 
-            parsed_igdb_res: list = unload_json(IGDB_res.text)
+        if cache and IGDB_CACHE_ENABLED:
+            cached_res = await self.cache.get(endpoint, key, ttl, tags)
+            if cached_res is not None:
+                return cached_res
 
-            if parsed_igdb_res is None:
-                raise IGDBInvalidReponse()
+        request = self.in_flight.get(key)
+        if request is not None:
+            # Callers may modify their response, followers get their own copy
+            return copy.deepcopy(await asyncio.shield(request))
 
-            return parsed_igdb_res
+        request = asyncio.ensure_future(self.fetch(endpoint, data, key, ttl, tags))
+        self.in_flight[key] = request
+        request.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        # A cancelled caller must not cancel the request of the others
+        return await asyncio.shield(request)
+
+    async def fetch(self, endpoint: str, data: str, key: str, ttl: int, tags: list[str]):
+        parsed_igdb_res = await self.request(endpoint, data)
+        if IGDB_CACHE_ENABLED:
+            await self.cache.set(endpoint, key, parsed_igdb_res, ttl, tags)
+        return parsed_igdb_res
+
+    async def request(self, endpoint: str, data: str):
+        # Outside of the app (scripts...) the clients are opened on first use
+        self.open_clients()
+
+        token_renewed = False
+        for attempt in range(IGDB_MAX_RETRIES + 1):
+            headers = await self.get_headers()
+            await self.rate_limiter.acquire()
+            async with self.concurrency:
+                IGDB_res = await self.api_client.post(
+                    endpoint,
+                    headers=headers,
+                    data=data,
+                )
+
+            # Token revoked or expired earlier than announced, renew it once
+            if IGDB_res.status_code == 401 and not token_renewed:
+                logger.warning("IGDB token rejected on [%s]. Renewing it.", endpoint)
+                if headers["Authorization"] == f"Bearer {self.token}":
+                    await self.load_token(renew=True)
+                token_renewed = True
+                continue
+
+            if IGDB_res.status_code != 429 or attempt == IGDB_MAX_RETRIES:
+                break
+
+            try:
+                delay = float(IGDB_res.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                delay = 0.5 * 2**attempt + random.uniform(0, 0.25)
+            logger.warning(
+                "IGDB rate limit reached on [%s]. Retrying in %.2fs. Attempt: %s",
+                endpoint,
+                delay,
+                attempt + 1,
+            )
+            await asyncio.sleep(delay)
+
+        if IGDB_res.status_code != 200:
+            raise IGDBInvalidReponseCode(IGDB_res.status_code)
+
+        parsed_igdb_res: list = unload_json(IGDB_res.text)
+
+        if parsed_igdb_res is None:
+            raise IGDBInvalidReponse()
+
+        return parsed_igdb_res
 
     async def get_image(self, size: int, img_hash: str) -> bytes:
         """Get image from IGDB API
@@ -99,28 +315,31 @@ class IGDB_Request:
                         screenshot_big, screenshot_huge, thumb, ...)
             img_hash (str): Hash of image (id of image)
 
+        Raises:
+            httpx.HTTPError, IGDBInvalidReponseCode: Download failed after max_retries attempts
+
         Returns:
             bytes: Image data
         """
         max_retries = 3
+        self.open_clients()
+        headers = await self.get_headers()
 
         for attempt in range(max_retries):
             try:
-                proxy = random.choice(PROXIES)
-                async with httpx.AsyncClient(proxies=proxy) as client:
-                    igdb_res = await client.get(
-                        f"https://images.igdb.com/igdb/image/upload/t_{size}/{img_hash}.jpg",
-                        headers=self.req_header,
-                        timeout=10,
-                    )
+                client = random.choice(self.image_clients)
+                igdb_res = await client.get(
+                    f"https://images.igdb.com/igdb/image/upload/t_{size}/{img_hash}.jpg",
+                    headers=headers,
+                )
 
-                    if igdb_res.status_code != 200:
-                        raise IGDBInvalidReponseCode(igdb_res.status_code)
+                if igdb_res.status_code != 200:
+                    raise IGDBInvalidReponseCode(igdb_res.status_code)
 
-                    return igdb_res.content
+                return igdb_res.content
 
             except (httpx.HTTPError, IGDBInvalidReponseCode):
-                if attempt < max_retries:
+                if attempt < max_retries - 1:
                     logger.warning(
                         "Error while getting image [%s] from IGDB. Retrying. Attempt: %s",
                         img_hash,
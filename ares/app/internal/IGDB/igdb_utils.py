@@ -1,24 +1,27 @@
-import asyncio
-from functools import partial
 import re
-import blurhash
-import aiofiles
+import time
 
 from app.internal.IGDB.igdb_request import igdb_request
+from app.internal.utilities.images import derive_images, run_in_image_pool
 
 from app.utils.loggers import base_logger as logger
 
+# Quality tiers of each media type, largest first: (IGDB size, file prefix, size, resize mode).
+# Only the largest available tier is downloaded, the smaller ones are derived from it.
 DOWNLOAD_QUALITY = {
     "artworks": [
-        ["screenshot_huge", "a_h"],
-        ["screenshot_big", "a_b"],
-        ["screenshot_med", "a_m"],
+        ["screenshot_huge", "a_h", (1280, 720), "lfill"],
+        ["screenshot_big", "a_b", (889, 500), "lfill"],
+        ["screenshot_med", "a_m", (569, 320), "lfill"],
+    ],
+    "cover": [
+        ["cover_big", "c_b", (264, 374), "fit"],
+        ["cover_small", "c_s", (90, 128), "fit"],
     ],
-    "cover": [["cover_big", "c_b"], ["cover_small", "c_s"]],
     "screenshots": [
-        ["screenshot_huge", "s_h"],
-        ["screenshot_big", "s_b"],
-        ["screenshot_med", "s_m"],
+        ["screenshot_huge", "s_h", (1280, 720), "lfill"],
+        ["screenshot_big", "s_b", (889, 500), "lfill"],
+        ["screenshot_med", "s_m", (569, 320), "lfill"],
     ],
 }
 
@@ -46,24 +49,10 @@ def detect_year_in_name(name: str) -> (int, str):
         return None, name
 
 
-async def run_in_thread(sync_function, *args, **kwargs) -> str:
-    """Run a synchronous function in a thread.
-        Used to run blurhash.encode in a thread.
-        blurhash.encode take approx 0.5s to run, so it's better to run it in a thread.
-
-    Args:
-        sync_function (function): Synchronous function to run
-
-    Returns:
-        str: Blurhash
-    """
-    loop = asyncio.get_running_loop()
-    sync_function_noargs = partial(sync_function, *args, **kwargs)
-    return await loop.run_in_executor(None, sync_function_noargs)
-
-
 async def igdb_image_downloader(field: str, image_id: str, game_id: str) -> str:
-    """Download image from IGDB and generate blurhash.
+    """Download image from IGDB, derive its smaller quality tiers and generate blurhash.
+        The largest tier is downloaded, falling back to the next one if it fails,
+        and the smaller tiers are resized locally in the image processing pool.
 
     Args:
         field (str): Type of media (artworks, cover, screenshots)
@@ -79,25 +68,37 @@ async def igdb_image_downloader(field: str, image_id: str, game_id: str) -> str:
     if dl_quality is None or image_id is None or image_id == "":
         return None
 
-    blur_hashs = []
-    for qual in dl_quality:
+    start = time.perf_counter()
+    for tier, qual in enumerate(dl_quality):
         try:
             res = await igdb_request.get_image(qual[0], image_id)
-            image_path = f"/bacchus/media/{game_id}/{qual[1]}_{image_id}.jpg"
-
-            async with aiofiles.open(image_path, "w+b") as f:
-                await f.write(res)
-
-            blur_hash = await run_in_thread(
-                blurhash.encode, image_path, x_components=4, y_components=3
-            )
-            if blur_hash:
-                blur_hashs.append(blur_hash)
-                
-            break
         except Exception:
-            pass
+            continue
+        if res:
+            break
+    else:
+        return None
+    downloaded = time.perf_counter()
+
+    image_path = f"/bacchus/media/{game_id}/{qual[1]}_{image_id}.jpg"
+    variants = [
+        (f"/bacchus/media/{game_id}/{variant[1]}_{image_id}.jpg", variant[2], variant[3])
+        for variant in dl_quality[tier + 1 :]
+    ]
+
+    try:
+        blur_hash = await run_in_image_pool(derive_images, res, image_path, variants)
+    except Exception as exc:
+        logger.error("Error while processing image [%s]: %s", image_id, exc)
+        return None
+
+    logger.info(
+        "Image [%s] (%s) processed: download %.0f ms, %s variants and blurhash %.0f ms.",
+        image_id,
+        qual[0],
+        (downloaded - start) * 1000,
+        len(variants),
+        (time.perf_counter() - downloaded) * 1000,
+    )
 
-    if blur_hashs:
-        return blur_hashs[-1]
-    return None
+    return blur_hash or None
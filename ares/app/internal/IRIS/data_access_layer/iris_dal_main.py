@@ -4,6 +4,7 @@ from slugify import slugify
 from psycopg import Error as psycopg_Error, sql
 
 from app.internal.IRIS.data_access_layer.iris_dal_new_game import IrisDalNewGame
+from app.internal.IRIS.data_access_layer.iris_statements import iris_statements
 from app.internal.IRIS.iris_const import GAME_TABLES
 
 from app.internal.errors.iris_exceptions import SQLError
@@ -11,13 +12,152 @@ from app.utils.loggers import base_logger as logger
 import app.connectors as connectors
 
 
+# JSON aggregated sub-queries of the game page, selectable by section name
+GAME_PAGE_SECTIONS = {
+    "categories": """--begin-sql
+        SELECT
+            t.id,
+            t.name,
+            t.slug
+        FROM
+            iris.theme t
+        INNER JOIN
+            iris.game_theme gt 
+                ON
+            gt.theme_id = t.id
+        WHERE
+            gt.game_id = g.id""",
+    "top_tracks": """--begin-sql
+        SELECT 
+            t.id AS track_id,
+            at2.album_id,
+            t.title,
+            t.slug,
+            t.file_id AS mpd,
+            t.like_count,
+            t.play_count,
+            t.last_played,
+            t.length
+        FROM 
+            iris.track t 
+        LEFT JOIN
+            iris.album_track at2 
+            ON
+            at2.track_id = t.id
+        INNER JOIN 
+            iris.album a 
+            ON
+            a.id = at2.album_id 
+            AND 
+            a.is_main 
+        WHERE
+            t.game_id = g.id
+        ORDER BY 
+            t.play_count desc
+        LIMIT %(top_tracks_limit)s""",
+    "albums": """--begin-sql
+        SELECT
+            a.id AS album_id,
+            a."name" ,
+            a.slug ,
+            a.is_certified ,
+            a.is_main ,
+            a.created_at ,
+            a.like_count
+        FROM
+            iris.album a 
+        WHERE 
+            a.game_id = g.id""",
+    "related_games": """--begin-sql
+        SELECT
+            ec.extra_id,
+            g2.name,
+            m2.image_id AS cover_id,
+            m2.blur_hash AS cover_hash,
+            a2.id AS main_album_id
+        FROM
+            iris.extra_content AS ec
+        LEFT JOIN iris.game g2 ON
+            g2.id = ec.extra_id 
+        LEFT JOIN iris.media m2 ON
+            m2.game_id = ec.extra_id 
+            AND m2.type = 'cover'
+        LEFT JOIN
+            iris.album a2 
+                ON
+            ec.extra_id = a2.game_id
+            AND a2.is_main
+            AND a2.is_visible
+        WHERE ec.game_id = g.id AND ec."type" = 'similar_game' 
+        LIMIT %(related_games_limit)s""",
+}
+
+
+def keyset_clause(
+    sort_key: str, id_column: str, sort_order: str, cursor: list | None
+) -> sql.Composable:
+    """Build the keyset pagination condition resuming after the cursor row
+
+    Args:
+        sort_key (str): Sort key SQL expression
+        id_column (str): Unique tie-breaker column
+        sort_order (str): Sort order (asc, desc)
+        cursor (list | None): Sort key and ID of the last row of the previous page
+
+    Returns:
+        sql.Composable: "AND (sort_key, id) </> (%(cursor_key)s, %(cursor_id)s)" or an empty condition
+    """
+    if cursor is None:
+        return sql.SQL("")
+
+    return sql.SQL(
+        "AND ({sort_key}, {id_column}) {operator} (%(cursor_key)s, %(cursor_id)s)"
+    ).format(
+        sort_key=sql.SQL(sort_key),
+        id_column=sql.SQL(id_column),
+        operator=sql.SQL("<" if sort_order == "desc" else ">"),
+    )
+
+
+def keyset_params(cursor: list | None) -> dict:
+    """Build the parameters of the keyset pagination condition
+
+    Args:
+        cursor (list | None): Sort key and ID of the last row of the previous page
+
+    Returns:
+        dict: cursor_key and cursor_id parameters, empty without cursor
+    """
+    if cursor is None:
+        return {}
+
+    return {"cursor_key": cursor[0], "cursor_id": cursor[1]}
+
+
+def random_segment_bounds(pivot: float, cursor: list | None) -> tuple[tuple, tuple]:
+    """Get the lower bounds (random_key, id) of the [pivot, 1) and [0, pivot)
+        segments of a random order walk, resuming after the cursor row
+
+    Args:
+        pivot (float): Starting random key in [0, 1)
+        cursor (list | None): Random key and ID of the last row of the previous page
+
+    Returns:
+        tuple[tuple, tuple]: Lower bounds of the first and second segments
+    """
+    if cursor is None:
+        return (pivot, -1), (-1, -1)
+    if cursor[0] >= pivot:
+        return tuple(cursor), (-1, -1)
+    return (2, 0), tuple(cursor)
+
+
 class IrisDataAccessLayer:
     """Class for IRIS Data Access Layer to the database"""
 
     IrisDalNewGame = IrisDalNewGame
 
     def __init__(self) -> None:
-        self.aconn = connectors.iris_aconn
         self.new_game = IrisDalNewGame(self)
         self.order_table = {
             "name_asc": 1,
@@ -42,10 +182,9 @@ class IrisDataAccessLayer:
         """
 
         try:
-            async with self.aconn.cursor() as curs:
-                query = "SELECT g.complete FROM iris.game g WHERE id=%s"
+            async with connectors.iris_connection() as aconn, aconn.cursor() as curs:
                 data = (game_id,)
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "check_game_existence", data)
                 res = await curs.fetchone()
 
                 if not res:
@@ -54,44 +193,47 @@ class IrisDataAccessLayer:
                     return 2
                 return 1
         except psycopg_Error as exc:
-            await self.aconn.rollback()
             raise SQLError("Error while checking game existence") from exc
 
-    async def delete_game(self, game_id: int, hard_delete: bool = False) -> None:
-        try:
-            async with self.aconn.cursor() as curs:
-                for game_table in GAME_TABLES:
-                    query = sql.SQL(
-                        "DELETE FROM iris.{table} WHERE game_id = %s;"
-                    ).format(table=sql.Identifier(game_table))
-                    data = (game_id,)
+    async def check_games_existence(self, game_ids: list[int]) -> dict[int, int]:
+        """Check if several games exist in database, in a single query
 
-                    await curs.execute(query, data)
+        Args:
+            game_ids (list[int]): Game IDs
 
-                if hard_delete:
-                    query = sql.SQL("DELETE FROM iris.game WHERE id=%s;")
-                    data = (game_id,)
+        Returns:
+            dict[int, int]: Existence of every game (see check_game_existence)
+        """
 
-                    await curs.execute(query, data)
+        try:
+            async with connectors.iris_connection() as aconn, aconn.cursor() as curs:
+                data = (game_ids,)
+                await iris_statements.execute(curs, "check_games_existence", data)
+
+                games_existence = dict.fromkeys(game_ids, 0)
+                for game in await curs.fetchall():
+                    games_existence[game["id"]] = 2 if game["complete"] is True else 1
+                return games_existence
+        except psycopg_Error as exc:
+            raise SQLError("Error while checking games existence") from exc
 
-                else:
-                    query = sql.SQL(
-                        """
-                        --begin-sql
-                        UPDATE iris.game 
-                            SET category = null, collection_id = null, 
-                                complete = false, first_release_date = null, parent_game = null, 
-                                rating = null, slug = null, summary = null 
-                            WHERE id=%s;"""
+    async def delete_game(self, game_id: int, hard_delete: bool = False) -> None:
+        try:
+            async with connectors.iris_connection() as aconn, aconn.cursor() as curs:
+                data = (game_id,)
+                for game_table in GAME_TABLES:
+                    await iris_statements.execute(
+                        curs, "delete_game_table", data, table=sql.Identifier(game_table)
                     )
-                    data = (game_id,)
 
-                    await curs.execute(query, data)
+                if hard_delete:
+                    await iris_statements.execute(curs, "hard_delete_game", data)
+                else:
+                    await iris_statements.execute(curs, "soft_delete_game", data)
 
-                await self.aconn.commit()
+                await aconn.commit()
                 logger.info("Game ID %s has been successfully deleted.", game_id)
         except psycopg_Error as exc:
-            await self.aconn.rollback()
             raise SQLError(f"Error while deleting game ID {game_id}") from exc
 
     async def get_full_game_data(self, game_id: int) -> dict:
@@ -112,60 +254,67 @@ class IrisDataAccessLayer:
             )
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql    
-                    SELECT
-                        g.id,
-                        g.name,
-                        g.complete,
-                        m.image_id AS cover_id,
-                        m.blur_hash AS cover_hash,
-                        g.parent_game,
-                        g.collection_id,
-                        c2.name AS collection_name,
-                        g.first_release_date,
-                        round(g.rating::numeric, 2) AS rating,
-                        g.popularity,
-                        g.summary,
-                        c.name AS TYPE,
-                        a.id AS main_album_id
-                    FROM
-                        iris.game g
-                    LEFT JOIN
-                        iris.media m 
-                            ON
-                        m.game_id = g.id
-                        AND m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            ON
-                        a.game_id = g.id
-                        AND a.is_main
-                        AND a.is_visible
-                    LEFT JOIN
-                        iris.category c 
-                            ON
-                        c.id = g.category
-                    LEFT JOIN 
-                        iris.collection c2 
-                            ON
-                        c2.id = g.collection_id 
-                    WHERE
-                        g.id = %s;
-                """
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (game_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_full_game_data", data)
                 return await curs.fetchone()
         except psycopg_Error as exc:
             raise SQLError("Error while getting base game data") from exc
 
+    async def get_game_page(
+        self,
+        game_id: int,
+        sections: list[str],
+        top_tracks_limit: int,
+        related_games_limit: int,
+    ) -> dict:
+        """Get full game data and the requested page sections in a single query
+
+        Args:
+            game_id (int): Game ID
+            sections (list[str]): Sections to include, keys of GAME_PAGE_SECTIONS
+                (categories, top_tracks, albums, related_games)
+            top_tracks_limit (int): Maximum number of top tracks
+            related_games_limit (int): Maximum number of related games
+
+        Raises:
+            SQLError: Error while getting game page data
+
+        Returns:
+            dict: Full game data with one list per requested section
+        """
+        try:
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = {
+                    "game_id": game_id,
+                    "top_tracks_limit": top_tracks_limit,
+                    "related_games_limit": related_games_limit,
+                }
+
+                await iris_statements.execute(
+                    curs,
+                    "get_game_page",
+                    data,
+                    sections=sql.SQL("").join(
+                        sql.SQL(
+                            ", (SELECT coalesce(json_agg(s), '[]'::json) FROM ({subquery}) s) AS {name}"
+                        ).format(
+                            subquery=sql.SQL(GAME_PAGE_SECTIONS[section]),
+                            name=sql.Identifier(section),
+                        )
+                        for section in sections
+                    ),
+                )
+                return await curs.fetchone()
+        except psycopg_Error as exc:
+            raise SQLError("Error while getting game page data") from exc
+
     async def get_games_sorted(
         self,
-        sort_type: Literal["g.rating", "random()", "g.first_release_date"],
+        sort_type: str,
         sort_order: Literal["asc", "desc"],
+        cursor: list | None,
         offset: int,
         limit: int,
     ) -> list:
@@ -173,8 +322,9 @@ class IrisDataAccessLayer:
             by a specific order (asc, desc)
 
         Args:
-            sort_type (str): Field to sort by
+            sort_type (str): Sort key SQL expression, returned as cursor_key
             sort_order (str): Sort order
+            cursor (list | None): Sort key and ID of the last game of the previous page
             offset (int): Offset
             limit (int): Limit
 
@@ -185,74 +335,61 @@ class IrisDataAccessLayer:
             list: Reduced games data
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql    
-                    SELECT
-                        g.id,
-                        g.name,
-                        m.image_id AS cover_id,
-                        m.blur_hash AS cover_hash,
-                        a.id AS main_album_id
-                    FROM
-                        iris.game g
-                    LEFT JOIN
-                        iris.media m 
-                            ON
-                        m.game_id = g.id
-                        AND m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            ON
-                        a.game_id = g.id
-                        AND a.is_main
-                        AND a.is_visible
-                    WHERE 
-                        g.complete 
-                    ORDER BY {sort_type} {sort_order}
-                    OFFSET %s
-                    LIMIT %s;
-                    """
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = {**keyset_params(cursor), "offset": offset, "limit": limit}
+
+                await iris_statements.execute(
+                    curs,
+                    "get_games_sorted",
+                    data,
+                    sort_type=sort_type,
+                    sort_order=sort_order,
+                    keyset=keyset_clause(sort_type, "g.id", sort_order, cursor),
                 )
-                query = query.format(
-                    sort_type=sql.SQL(sort_type),
-                    sort_order=sql.SQL(sort_order),
+                return await curs.fetchall()
+        except psycopg_Error as exc:
+            raise SQLError("Error while getting base game data") from exc
+
+    async def get_games_random(
+        self, pivot: float, cursor: list | None, offset: int, limit: int
+    ) -> list:
+        """Get reduced games in a repeatable random order: games are walked by their
+            precomputed random key starting at the pivot and wrapping around, so
+            each page is an index range scan of at most offset + limit rows
+
+        Args:
+            pivot (float): Starting random key in [0, 1), derived from the client seed
+            cursor (list | None): Random key and ID of the last game of the previous page
+            offset (int): Offset
+            limit (int): Limit
+
+        Raises:
+            SQLError: Error while getting games data
+
+        Returns:
+            list: Reduced games data with their random key as cursor_key
+        """
+        upper_bound, lower_bound = random_segment_bounds(pivot, cursor)
+
+        try:
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = (
+                    1, *upper_bound, offset + limit,
+                    pivot, *lower_bound, offset + limit,
+                    offset, limit,
                 )
-                data = (offset, limit)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_games_random", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting base game data") from exc
 
     async def get_reduced_game_data(self, game_id: int) -> dict:
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT
-                        g.id,
-                        g.name,
-                        m.image_id as cover_id,
-                        m.blur_hash as cover_hash,
-                        a.id as album_id
-                    FROM
-                        iris.game g
-                    LEFT JOIN
-                        iris.media m 
-                            on m.game_id = g.id
-                            and m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            on a.game_id = g.id
-                            and a.is_main 
-                            and a.is_visible 
-                    WHERE
-                        g.id = %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (game_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_reduced_game_data", data)
                 return await curs.fetchone()
         except psycopg_Error as exc:
             raise SQLError("Error while getting base game data") from exc
@@ -270,34 +407,24 @@ class IrisDataAccessLayer:
             list: List of categories
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT
-                        t.id,
-                        t.name,
-                        t.slug
-                    FROM
-                        iris.theme t
-                    LEFT JOIN
-                        iris.game_theme gt 
-                            ON
-                        gt.theme_id = t.id
-                    WHERE
-                        gt.game_id = %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (game_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_categories_by_game_id", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting categories") from exc
 
-    async def get_game_top_tracks(self, game_id: int, offset: int, limit: int) -> list:
+    async def get_game_top_tracks(
+        self, game_id: int, cursor: list | None, offset: int, limit: int
+    ) -> list:
         """Get top tracks of a game by game ID
 
         Args:
             game_id (int): Game ID
+            cursor (list | None): Play count and ID of the last track of the previous page
+            offset (int): Offset
+            limit (int): Limit
 
         Raises:
             SQLError: Error while getting top tracks
@@ -306,41 +433,20 @@ class IrisDataAccessLayer:
             list: List of top tracks
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT 
-                        t.id AS track_id,
-                        at2.album_id,
-                        t.title,
-                        t.slug,
-                        t.file_id AS mpd,
-                        t.like_count,
-                        t.play_count,
-                        t.last_played,
-                        t.length
-                    FROM 
-                        iris.track t 
-                    LEFT JOIN
-                        iris.album_track at2 
-                        ON
-                        at2.track_id = t.id
-                    INNER JOIN 
-                        iris.album a 
-                        ON
-                        a.id = at2.album_id 
-                        AND 
-                        a.is_main 
-                    WHERE
-                        t.game_id = %s
-                    ORDER BY 
-	                    t.play_count desc
-                    OFFSET %s
-                    LIMIT %s;"""
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = {
+                    "game_id": game_id,
+                    **keyset_params(cursor),
+                    "offset": offset,
+                    "limit": limit,
+                }
+
+                await iris_statements.execute(
+                    curs,
+                    "get_game_top_tracks",
+                    data,
+                    keyset=keyset_clause("t.play_count", "t.id", "desc", cursor),
                 )
-                data = (game_id, offset, limit)
-
-                await curs.execute(query, data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting top tracks") from exc
@@ -358,25 +464,10 @@ class IrisDataAccessLayer:
             list: List of albums
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT
-                        a.id AS album_id,
-                        a."name" ,
-                        a.slug ,
-                        a.is_certified ,
-                        a.is_main ,
-                        a.created_at ,
-                        a.like_count
-                    FROM
-                        iris.album a 
-                    WHERE 
-                        a.game_id  = %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (game_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_games_albums", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting albums") from exc
@@ -396,44 +487,18 @@ class IrisDataAccessLayer:
             list: List of related games
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT
-                        ec.extra_id,
-                        g.name,
-                        m.image_id AS cover_id,
-                        m.blur_hash AS cover_hash,
-                        a.id AS main_album_id
-                    FROM
-                        iris.extra_content AS ec
-                    LEFT JOIN iris.game g ON
-                        g.id = ec.extra_id 
-                    LEFT JOIN iris.media m ON
-                        m.game_id = ec.extra_id 
-                        AND m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            ON
-                        ec.extra_id  = a.game_id
-                        AND a.is_main
-                        AND a.is_visible
-                    WHERE ec.game_id = %s AND ec."type" = 'similar_game' 
-                    OFFSET %s
-                    LIMIT %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (game_id, offset, limit)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_game_related_games", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting related games") from exc
 
     async def get_next_album_id(self):
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL("SELECT MAX(id) FROM iris.album;")
-                await curs.execute(query)
+            async with connectors.iris_connection() as aconn, aconn.cursor() as curs:
+                await iris_statements.execute(curs, "get_next_album_id")
                 res = await curs.fetchone()
                 max_id = res.get("max")
 
@@ -446,15 +511,12 @@ class IrisDataAccessLayer:
 
     async def check_album_existence(self, game_id):
         try:
-            async with self.aconn.cursor() as curs:
+            async with connectors.iris_connection() as aconn, aconn.cursor() as curs:
                 name = "Original Soundtrack"
 
-                query = sql.SQL(
-                    "SELECT id FROM iris.album WHERE game_id=%s AND name=%s;"
-                )
                 data = (game_id, name)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "check_album_existence", data)
                 res = await curs.fetchone()
 
                 return res.get("id", None) if res else None
@@ -463,41 +525,28 @@ class IrisDataAccessLayer:
 
     async def add_game_tracks(self, game_id, album_id, tracks, source, video_id):
         try:
-            async with connectors.iris_aconn.transaction():
-                async with self.aconn.cursor() as curs:
-                    query = sql.SQL(
-                        """INSERT INTO iris.album_source(name, media_type, url)
-                            VALUES (%s,%s,%s) RETURNING id;"""
-                    )
+            async with connectors.iris_connection() as aconn, aconn.transaction():
+                async with aconn.cursor() as curs:
                     # "video" in place of media_type is a placeholder for now
                     data = (
                         source,
                         "video",
                         "https://www.youtube.com/watch?v=" + video_id,
                     )
-                    await curs.execute(query, data)
+                    await iris_statements.execute(curs, "insert_album_source", data)
                     res = await curs.fetchone()
                     source_id = res.get("id")
 
                     name = "Original Soundtrack"
                     name_slug = slugify(name)
 
-                    query = sql.SQL(
-                        """INSERT INTO iris.album (id, game_id, name, slug, is_main, is_visible, source_id)
-                        VALUES (%s,%s,%s,%s,%s,%s,%s);"""
-                    )
                     data = (album_id, game_id, name, name_slug, "t", "t", source_id)
-                    await curs.execute(query, data)
+                    await iris_statements.execute(curs, "insert_album", data)
 
                     for track in tracks:
                         if track["title"] is None:
                             track["title"] = "Untitled"
 
-                        query = sql.SQL(
-                            """INSERT INTO iris.track 
-                                    (game_id, title, slug, file_id, length)
-                            VALUES (%s,%s,%s,%s,%s) RETURNING id;"""
-                        )
                         data = (
                             game_id,
                             track["title"],
@@ -505,19 +554,14 @@ class IrisDataAccessLayer:
                             track["id"],
                             track["duration"],
                         )
-                        await curs.execute(query, data)
+                        await iris_statements.execute(curs, "insert_track", data)
                         res = await curs.fetchone()
                         track_id = res.get("id")
 
-                        query = sql.SQL(
-                            "INSERT INTO iris.album_track (album_id, track_id) VALUES (%s,%s);"
-                        )
                         data = (album_id, track_id)
-                        await curs.execute(query, data)
+                        await iris_statements.execute(curs, "insert_album_track", data)
 
-            await self.aconn.commit()
         except psycopg_Error as exc:
-            await self.aconn.rollback()
             logger.error(traceback.format_exc())
             raise SQLError("Error while adding game tracks") from exc
 
@@ -532,36 +576,11 @@ class IrisDataAccessLayer:
         """
 
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT
-                        c."name" AS collection_name,
-                        count(DISTINCT(g.id)) AS n_games,
-                        count(at2.track_id) AS n_tracks
-                    FROM
-                        iris.collection c
-                    LEFT JOIN iris.game g 
-                        ON g.collection_id = c.id
-                    LEFT JOIN iris.media m ON
-                        m.game_id = g.id
-                        AND m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            ON
-                        g.id = a.game_id
-                        AND a.is_main
-                        AND a.is_visible
-                    LEFT JOIN 
-                        iris.album_track at2 
-                        ON at2.album_id = a.id 
-                    WHERE c.id = %s
-                    GROUP BY c.name;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (collection_id,)
 
-                await curs.execute(query, data)
-                return (await curs.fetchall())[0]
+                await iris_statements.execute(curs, "get_collection_info_by_id", data)
+                return await curs.fetchone()
         except psycopg_Error as exc:
             raise SQLError("Error while getting related games") from exc
 
@@ -576,98 +595,80 @@ class IrisDataAccessLayer:
         """
 
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT
-                        g.id,
-                        g.name,
-                        m.image_id AS cover_id,
-                        m.blur_hash AS cover_hash,
-                        a.id AS main_album_id
-                    FROM
-                        iris.game g
-                    LEFT JOIN
-                        iris.media m 
-                            ON
-                        m.game_id = g.id
-                        AND m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            ON
-                        a.game_id = g.id
-                        AND a.is_main
-                        AND a.is_visible
-                    WHERE 
-                        g.collection_id = %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (collection_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_collection_reduce_game_info", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting related games") from exc
 
+    async def get_collections_reduce_game_info(
+        self, collection_ids: list[int]
+    ) -> dict[int, list[dict]]:
+        """Data Access Layer method to get minimal game info of several collections
+            in a single query
+
+        Args:
+            collection_ids (list[int]): The IDs of the collections
+
+        Returns:
+            dict[int, list[dict]]: Minimal game info by collection ID
+        """
+
+        try:
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = (collection_ids,)
+
+                await iris_statements.execute(curs, "get_collections_reduce_game_info", data)
+
+                games = {collection_id: [] for collection_id in collection_ids}
+                for game in await curs.fetchall():
+                    games[game.pop("collection_id")].append(game)
+                return games
+        except psycopg_Error as exc:
+            raise SQLError("Error while getting collections games") from exc
+
     async def get_collection_top_tracks(
-        self, collection_id: int, offset: int, limit: int
+        self, collection_id: int, cursor: list | None, offset: int, limit: int
     ) -> list:
         """Data Access Layer method to get collection top tracks by ID
 
         Args:
             collection_id (int): The ID of the collection
+            cursor (list | None): Play count and ID of the last track of the previous page
+            offset (int): Offset
+            limit (int): Limit
 
         Returns:
             dict: Collection data
         """
 
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT 
-                        t.id AS track_id,
-                        at2.album_id,
-                        t.title,
-                        t.slug,
-                        t.file_id AS mpd,
-                        t.like_count,
-                        t.play_count,
-                        t.last_played,
-                        t.length
-                    FROM
-                        iris.game g 
-                    LEFT JOIN  
-                        iris.track t 
-                        ON t.game_id = g.id 
-                    LEFT JOIN
-                        iris.album_track at2 
-                        ON
-                        at2.track_id = t.id
-                    INNER JOIN 
-                        iris.album a 
-                        ON
-                        a.id = at2.album_id 
-                        AND 
-                        a.is_main 
-                    WHERE
-                        g.collection_id = %s
-                    ORDER BY 
-                        t.play_count desc
-                    OFFSET %s
-                    LIMIT %s;"""
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = {
+                    "collection_id": collection_id,
+                    **keyset_params(cursor),
+                    "offset": offset,
+                    "limit": limit,
+                }
+
+                await iris_statements.execute(
+                    curs,
+                    "get_collection_top_tracks",
+                    data,
+                    keyset=keyset_clause("t.play_count", "t.id", "desc", cursor),
                 )
-                data = (collection_id, offset, limit)
-
-                await curs.execute(query, data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting top tracks") from exc
 
     async def get_collections_sorted(
         self,
-        sort_type: Literal["avg_rating", "random()", "latest_game_release_date"],
+        sort_type: str,
         sort_order: Literal["asc", "desc"],
         min_games: int,
+        cursor: list | None,
         offset: int,
         limit: int,
     ) -> list:
@@ -675,8 +676,10 @@ class IrisDataAccessLayer:
             by a specific order (asc, desc)
 
         Args:
-            sort_type (str): Field to sort by
+            sort_type (str): Sort key SQL expression on collection_stats, returned as cursor_key
             sort_order (str): Sort order
+            min_games (int): Minimum number of games in the collection
+            cursor (list | None): Sort key and ID of the last collection of the previous page
             offset (int): Offset
             limit (int): Limit
 
@@ -687,49 +690,81 @@ class IrisDataAccessLayer:
             list: Reduced games data
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql    
-                    SELECT
-                        c.id,
-                        c.name,
-                        count(DISTINCT(g.id)) AS n_games,
-                        avg(DISTINCT(g.rating)) AS avg_rating,
-                        max(DISTINCT(g.first_release_date)) AS latest_game_release_date,
-                        count(at2.track_id) AS n_tracks
-                    FROM
-                        iris.collection c
-                    LEFT JOIN iris.game g 
-                        ON g.collection_id = c.id
-                    LEFT JOIN iris.media m ON
-                        m.game_id = g.id
-                        AND m.type = 'cover'
-                    LEFT JOIN
-                        iris.album a 
-                            ON
-                        g.id = a.game_id
-                        AND a.is_main
-                        AND a.is_visible
-                    LEFT JOIN 
-                        iris.album_track at2 
-                        ON at2.album_id = a.id 
-                    GROUP BY c.id
-                    HAVING count(DISTINCT(g.id)) >= %s
-                    ORDER BY {sort_type} {sort_order}
-                    OFFSET %s
-                    LIMIT %s;
-                    """
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = {
+                    "min_games": min_games,
+                    **keyset_params(cursor),
+                    "offset": offset,
+                    "limit": limit,
+                }
+
+                await iris_statements.execute(
+                    curs,
+                    "get_collections_sorted",
+                    data,
+                    sort_type=sort_type,
+                    sort_order=sort_order,
+                    keyset=keyset_clause(
+                        sort_type, "cs.collection_id", sort_order, cursor
+                    ),
                 )
-                query = query.format(
-                    sort_type=sql.SQL(sort_type),
-                    sort_order=sql.SQL(sort_order),
+                return await curs.fetchall()
+        except psycopg_Error as exc:
+            raise SQLError("Error while getting base game data") from exc
+
+    async def get_collections_random(
+        self, pivot: float, min_games: int, cursor: list | None, offset: int, limit: int
+    ) -> list:
+        """Get collections in a repeatable random order, walked by their random key
+            from the pivot like get_games_random, on the collection_stats
+            (random_key, collection_id) index
+
+        Args:
+            pivot (float): Starting random key in [0, 1), derived from the client seed
+            min_games (int): Minimum number of games in the collection
+            cursor (list | None): Random key and ID of the last collection of the previous page
+            offset (int): Offset
+            limit (int): Limit
+
+        Raises:
+            SQLError: Error while getting collections data
+
+        Returns:
+            list: Collections data with their random key as cursor_key
+        """
+        upper_bound, lower_bound = random_segment_bounds(pivot, cursor)
+
+        try:
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
+                data = (
+                    min_games, 1, *upper_bound, offset + limit,
+                    min_games, pivot, *lower_bound, offset + limit,
+                    offset, limit,
                 )
-                data = (min_games, offset, limit)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_collections_random", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
-            raise SQLError("Error while getting base game data") from exc
+            raise SQLError("Error while getting collections data") from exc
+
+    async def refresh_collection_stats(self) -> None:
+        """Refresh the collection statistics materialized view without blocking
+            its readers. Only the rows that changed are rewritten.
+
+        Raises:
+            SQLError: Error while refreshing collection statistics
+        """
+        try:
+            async with connectors.iris_connection() as aconn, aconn.cursor() as curs:
+                query = sql.SQL(
+                    "REFRESH MATERIALIZED VIEW CONCURRENTLY iris.collection_stats;"
+                )
+
+                await curs.execute(query)
+                await aconn.commit()
+                logger.info("Collection statistics refreshed.")
+        except psycopg_Error as exc:
+            raise SQLError("Error while refreshing collection statistics") from exc
 
     async def get_album_details_by_id(self, album_id: str) -> dict:
         """ Get album details by its ID
@@ -745,23 +780,10 @@ class IrisDataAccessLayer:
             dict: Album data
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                        SELECT 
-                            a."name",
-                            a.slug,
-                            a.game_id,
-                            a.is_certified,
-                            a.is_main,
-                            a.created_at,
-                            a.like_count
-                        FROM iris.album a 
-                        WHERE a.id = %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (album_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_album_details_by_id", data)
                 return await curs.fetchone()
         except psycopg_Error as exc:
             raise SQLError("Error while getting album by ID") from exc
@@ -779,29 +801,10 @@ class IrisDataAccessLayer:
             list: List of album tracks
         """
         try:
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """--begin-sql
-                    SELECT 
-                        at2.track_id,
-                        t.title,
-                        t.slug,
-                        t.file_id,
-                        t.like_count,
-                        t.play_count,
-                        t.last_played,
-                        t.length
-                    FROM
-                        iris.album_track at2
-                    LEFT JOIN
-                        iris.track t 
-                        ON at2.track_id = t.id 
-                    WHERE 
-                        at2.album_id = %s;"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (album_id,)
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "get_album_tracks_by_id", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while getting album tracks by ID") from exc
@@ -817,21 +820,7 @@ class IrisDataAccessLayer:
         """
         try:
             logger.info("search_object: %s", search_object)
-            async with self.aconn.cursor() as curs:
-                query = sql.SQL(
-                    """SELECT * FROM iris.search_games(
-                        %s::text, 
-                        %s::int[], 
-                        %s::int[], 
-                        %s::text[],
-                        %s::real, 
-                        %s::real, 
-                        %s::date, 
-                        %s::date, 
-                        %s::int, 
-                        %s::int, 
-                        %s::int);"""
-                )
+            async with connectors.iris_read_connection() as aconn, aconn.cursor() as curs:
                 data = (
                     search_object.game_name,
                     search_object.categories,
@@ -846,7 +835,7 @@ class IrisDataAccessLayer:
                     self.order_table.get(search_object.order, 1),
                 )
 
-                await curs.execute(query, data)
+                await iris_statements.execute(curs, "search_games", data)
                 return await curs.fetchall()
         except psycopg_Error as exc:
             raise SQLError("Error while searching") from exc
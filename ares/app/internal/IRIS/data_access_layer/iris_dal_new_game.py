@@ -13,30 +13,55 @@ from app.internal.errors.iris_exceptions import SQLError
 from app.utils.loggers import base_logger as logger
 
 
-async def insert_media_with_semaphore(semaphore, media, insert_media):
-    async with semaphore:
-        return await insert_media(media)
+# Concurrent image downloads of a media field
+MEDIA_DOWNLOAD_CONCURRENCY = 8
 
 
 class IrisDalNewGame:
     def __init__(self, IRIS_DAL, gameID: int = None) -> None:
         self.IRIS_DAL = IRIS_DAL
         
-        self.iris_aconn = connectors.iris_aconn
-        
         self.gameID = gameID
         self.igdb_client = igdb_client
+        # Number of statements / batches sent to the database while ingesting the game
+        self.round_trips = 0
 
         try:
             os.mkdir(f"/bacchus/media/{self.gameID}")
         except FileExistsError:
             pass
 
+    async def execute(self, cur, query, data=None) -> None:
+        """Execute a query, counting its round-trip
+
+        Args:
+            cur (AsyncCursor): Cursor of the ingest connection
+            query (str | sql.Composable): Query
+            data (tuple | list, optional): Query parameters. Defaults to None.
+        """
+        self.round_trips += 1
+        await cur.execute(query, data)
+
+    async def executemany(self, cur, query, rows: list) -> None:
+        """Execute a query once per row, pipelined by psycopg in a single round-trip
+
+        Args:
+            cur (AsyncCursor): Cursor of the ingest connection
+            query (str | sql.Composable): Query
+            rows (list): Query parameters of every row
+        """
+        if not rows:
+            return
+
+        self.round_trips += 1
+        await cur.executemany(query, rows)
+
     async def commit_changes(self) -> None:
         """Commit changes to database"""
 
         try:
-            await self.iris_aconn.commit()
+            async with connectors.iris_connection() as aconn:
+                await aconn.commit()
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while committing changes to game ID {self.gameID}"
@@ -49,8 +74,8 @@ class IrisDalNewGame:
             query = sql.SQL("UPDATE iris.game SET complete = true WHERE id=%s;")
             data = (self.gameID,)
             
-            async with self.iris_aconn.cursor() as cur:
-                await cur.execute(query, data)
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                await self.execute(cur, query, data)
         except SQLError as exc:
             logger.error(
                 "An error occurred while finalizing game ID %s. Error: %s",
@@ -60,7 +85,8 @@ class IrisDalNewGame:
             raise
 
     async def add_new_game_root_data(self, game_id: int, game_name=None) -> None:
-        """Add new game ID to database
+        """Add new game ID to database. A stub row inserted meanwhile for the game
+            (see ensure_stub_games) is upgraded instead.
 
         Args:
             game_id (int): Game ID
@@ -68,19 +94,51 @@ class IrisDalNewGame:
         """
 
         try:
-            query = "INSERT INTO iris.game (id, complete, name) VALUES (%s,False,%s);"
+            query = """INSERT INTO iris.game (id, complete, name) VALUES (%s,False,%s)
+                ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name;"""
             data = (
                 game_id,
                 game_name,
             )
             
-            async with self.iris_aconn.cursor() as cur:
-                await cur.execute(query, data)
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                await self.execute(cur, query, data)
                 
-            # await self.iris_aconn.commit()
         except psycopg_Error as exc:
             raise SQLError("Error while inserting new game ID") from exc
 
+    async def ensure_stub_games(self, games: list[tuple[int, str]]) -> None:
+        """Insert incomplete root rows for the referenced games that are not in
+            database yet, in a single statement
+
+        Args:
+            games (list[tuple[int, str]]): Game ID and name of every referenced game
+        """
+        if not games:
+            return
+
+        # Sorted so that concurrent ingests take the stub locks in the same order.
+        # Their root rows are locked first though, two ingests referencing each
+        # other's new game still deadlock, process_game retries them.
+        games = sorted(games, key=lambda game: game[0])
+
+        try:
+            query = sql.SQL(
+                """--begin-sql
+                INSERT INTO iris.game (id, complete, name)
+                    SELECT g.id, False, g.name FROM unnest(%s::int[], %s::text[]) AS g(id, name)
+                ON CONFLICT (id) DO NOTHING;"""
+            )
+            data = (
+                [game_id for game_id, _ in games],
+                [game_name for _, game_name in games],
+            )
+
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                await self.execute(cur, query, data)
+        except psycopg_Error as exc:
+            raise SQLError("Error while inserting referenced game IDs") from exc
+
     async def add_base_data(self, field: str, field_data: dict) -> None:
         """Add base data to game
 
@@ -98,8 +156,8 @@ class IrisDalNewGame:
                 self.gameID,
             )
             
-            async with self.iris_aconn.cursor() as cur:
-                await cur.execute(query, data)
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                await self.execute(cur, query, data)
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding base data to game ID {self.gameID}"
@@ -122,8 +180,8 @@ class IrisDalNewGame:
                 self.gameID,
             )
 
-            async with self.iris_aconn.cursor() as cur:
-                await cur.execute(query, data)
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                await self.execute(cur, query, data)
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding date data to game ID {self.gameID}"
@@ -142,9 +200,7 @@ class IrisDalNewGame:
             if not parent_id:
                 return
 
-            parent_existence = await self.IRIS_DAL.check_game_existence(field_data.get("id"))
-            if parent_existence == 0:
-                await self.add_new_game_root_data(parent_id, field_data.get("name"))
+            await self.ensure_stub_games([(parent_id, field_data.get("name"))])
 
             query = sql.SQL("UPDATE iris.game SET {field} = %s WHERE id=%s;").format(
                 field=sql.Identifier(field)
@@ -154,8 +210,8 @@ class IrisDalNewGame:
                 self.gameID,
             )
             
-            async with self.iris_aconn.cursor() as cur:
-                await cur.execute(query, data)
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                await self.execute(cur, query, data)
 
         except psycopg_Error as exc:
             logger.error(
@@ -176,28 +232,24 @@ class IrisDalNewGame:
         """
 
         try:
-            async with self.iris_aconn.cursor() as cur:
-                for extra_data in field_data:
-                    extra_data_id = extra_data.get("id")
-
-                    if not extra_data_id:
-                        continue
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                extra_games = [
+                    (extra_data.get("id"), extra_data.get("name"))
+                    for extra_data in field_data
+                    if extra_data.get("id")
+                ]
+                await self.ensure_stub_games(extra_games)
+
+                rows = [
+                    (self.gameID, extra_data_id, sub_field)
+                    for extra_data_id, _ in extra_games
+                ]
 
-                    extra_data_existence = await self.IRIS_DAL.check_game_existence(extra_data_id)
-
-                    if extra_data_existence == 0:
-                        await self.add_new_game_root_data(extra_data_id, extra_data.get("name"))
+                query = sql.SQL(
+                    "INSERT INTO iris.{table} (game_id, extra_id, type) VALUES (%s,%s,%s);"
+                ).format(table=sql.Identifier(field))
 
-                    query = sql.SQL(
-                        "INSERT INTO iris.{table} (game_id, extra_id, type) VALUES (%s,%s,%s);"
-                    ).format(table=sql.Identifier(field))
-                    data = (
-                        self.gameID,
-                        extra_data_id,
-                        sub_field,
-                    )
-                    
-                    await cur.execute(query, data)
+                await self.executemany(cur, query, rows)
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding extra data to game ID {self.gameID}"
@@ -215,7 +267,7 @@ class IrisDalNewGame:
         """
 
         try:
-            async with self.iris_aconn.cursor() as cur:
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
                 query = sql.SQL(
                     "INSERT INTO iris.{table} ({fields}) VALUES ({values}) ON CONFLICT DO NOTHING;"
                 ).format(
@@ -227,7 +279,7 @@ class IrisDalNewGame:
                 )
                 data = [*field_data.values()]
 
-                await cur.execute(query, data)
+                await self.execute(cur, query, data)
 
                 query = sql.SQL("UPDATE iris.game SET {field} = %s WHERE id=%s;").format(
                     field=sql.Identifier(base_field)
@@ -237,14 +289,26 @@ class IrisDalNewGame:
                     self.gameID,
                 )
                 
-                await cur.execute(query, data)
+                await self.execute(cur, query, data)
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding base extra data to game ID {self.gameID}"
             ) from exc
 
+    async def fetch_companies(self, field_data: list) -> list:
+        """Get the data of the companies involved in the game from IGDB.
+            Called before the ingest transaction, which must not wait on the network.
+
+        Args:
+            field_data (list): Involved companies field data
+
+        Returns:
+            list: Companies data
+        """
+        return await self.igdb_client.get_companies(field_data)
+
     async def add_company_data(
-        self, field: str, sub_field: str, field_data: dict
+        self, field: str, sub_field: str, field_data: dict, companies_data: list
     ) -> None:
         """Add company data to game
 
@@ -252,38 +316,42 @@ class IrisDalNewGame:
             field (str): Field name
             sub_field (str): Sub field name
             field_data (dict): Field data
+            companies_data (list): Companies data (see fetch_companies)
         """
 
         try:
-            companies_data: list = await self.igdb_client.get_companies(field_data)
-            async with self.iris_aconn.cursor() as cur:
-                for company_data in companies_data:
-                    query = sql.SQL(
-                        """INSERT INTO iris.{table} 
-                                (id, name, slug, description, logo_id) VALUES (%s,%s,%s,%s,%s) 
-                            ON CONFLICT DO NOTHING;"""
-                    ).format(
-                        table=sql.Identifier(sub_field),
-                    )
-                    data = (
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                query = sql.SQL(
+                    """INSERT INTO iris.{table} 
+                            (id, name, slug, description, logo_id) VALUES (%s,%s,%s,%s,%s) 
+                        ON CONFLICT DO NOTHING;"""
+                ).format(
+                    table=sql.Identifier(sub_field),
+                )
+                rows = [
+                    (
                         company_data.get("id"),
                         company_data.get("name"),
                         company_data.get("slug"),
                         company_data.get("description"),
                         company_data.get("logo", {}).get("image_id"),
                     )
-                    
-                    await cur.execute(query, data)
-
-                for involved_company in field_data:
-                    query = sql.SQL(
-                        """INSERT INTO iris.{table} 
-                                (game_id, company_id, developer, porting, publisher, supporting) 
-                            VALUES (%s,%s,%s,%s,%s,%s) ON CONFLICT DO NOTHING;"""
-                    ).format(
-                        table=sql.Identifier(field),
+                    for company_data in sorted(
+                        companies_data, key=lambda company: company.get("id")
                     )
-                    data = (
+                ]
+
+                await self.executemany(cur, query, rows)
+
+                query = sql.SQL(
+                    """INSERT INTO iris.{table} 
+                            (game_id, company_id, developer, porting, publisher, supporting) 
+                        VALUES (%s,%s,%s,%s,%s,%s) ON CONFLICT DO NOTHING;"""
+                ).format(
+                    table=sql.Identifier(field),
+                )
+                rows = [
+                    (
                         self.gameID,
                         involved_company.get("company"),
                         involved_company.get("developer"),
@@ -291,16 +359,55 @@ class IrisDalNewGame:
                         involved_company.get("publisher"),
                         involved_company.get("supporting"),
                     )
-                    
-                    await cur.execute(query, data)
+                    for involved_company in field_data
+                ]
+
+                await self.executemany(cur, query, rows)
 
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding company data to game ID {self.gameID}"
             ) from exc
 
+    async def download_media(self, field_type: str, field_data: dict) -> dict[str, str]:
+        """Download the images of a media field and compute their blurhash.
+            Called before the ingest transaction, which must not wait on the network.
+
+        Args:
+            field_type (str): Field type (artworks, cover, screenshots)
+            field_data (dict): Field data, one media or a list of media
+
+        Returns:
+            dict[str, str]: Blurhash of every downloaded image by image ID
+        """
+        medias = field_data if isinstance(field_data, list) else [field_data]
+        semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+
+        async def download(media: dict):
+            async with semaphore:
+                return await igdb_image_downloader(
+                    field_type, media.get("image_id"), self.gameID
+                )
+
+        results = await asyncio.gather(
+            *(download(media) for media in medias), return_exceptions=True
+        )
+
+        blur_hashes = {}
+        for media, result in zip(medias, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    "An error occurred while adding media data to game ID %s. Error: %s",
+                    self.gameID,
+                    result,
+                )
+            elif result is not None:
+                blur_hashes[media.get("image_id")] = result
+
+        return blur_hashes
+
     async def add_media_data(
-        self, field: str, field_type: str, field_data: dict
+        self, field: str, field_type: str, field_data: dict, blur_hashes: dict[str, str]
     ) -> None:
         """Add media data to game
 
@@ -308,58 +415,35 @@ class IrisDalNewGame:
             field (str): Field name
             field_type (str): Field type
             field_data (str): Field data
+            blur_hashes (dict[str, str]): Blurhash of the downloaded images (see
+                download_media), images that failed to download are skipped
         """
 
-        try:
-            async with self.iris_aconn.cursor() as cur:
-                async def insert_media(media: dict):
-                    image_id = media.get("image_id")
-                    blur_hash = await igdb_image_downloader(
-                        field_type, image_id, self.gameID
-                    )
+        medias = field_data if isinstance(field_data, list) else [field_data]
 
-                    if blur_hash is None:
-                        return
-
-                    query = sql.SQL(
-                        """INSERT INTO iris.{table} 
-                        (image_id, game_id, type, height, width, blur_hash) 
-                        VALUES (%s,%s,%s,%s,%s,%s);"""
-                    ).format(
-                        table=sql.Identifier(field),
-                    )
-                    data = (
-                        image_id,
+        try:
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                query = sql.SQL(
+                    """INSERT INTO iris.{table} 
+                    (image_id, game_id, type, height, width, blur_hash) 
+                    VALUES (%s,%s,%s,%s,%s,%s);"""
+                ).format(
+                    table=sql.Identifier(field),
+                )
+                rows = [
+                    (
+                        media.get("image_id"),
                         self.gameID,
                         field_type,
                         media.get("height"),
                         media.get("width"),
-                        blur_hash,
+                        blur_hashes[media.get("image_id")],
                     )
-                    await cur.execute(query, data)
-
-                semaphore = asyncio.Semaphore(8)
-
-                tasks = []
+                    for media in medias
+                    if media.get("image_id") in blur_hashes
+                ]
 
-                if isinstance(field_data, list):
-                    for media in field_data:
-                        task = insert_media_with_semaphore(semaphore, media, insert_media)
-                        tasks.append(task)
-
-                else:
-                    task = insert_media_with_semaphore(semaphore, field_data, insert_media)
-                    tasks.append(task)
-
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for result in results:
-                    if isinstance(result, Exception):
-                        logger.error(
-                            "An error occurred while adding media data to game ID %s. Error: %s",
-                            self.gameID,
-                            result,
-                        )
+                await self.executemany(cur, query, rows)
 
         except psycopg_Error as exc:
             raise SQLError(
@@ -375,20 +459,27 @@ class IrisDalNewGame:
         """
 
         try:
-            async with self.iris_aconn.cursor() as cur:
-                for elmt_data in field_data:
+            # IGDB omits empty fields, so elements are batched by set of columns
+            rows_by_fields: dict[tuple, list] = {}
+            for elmt_data in field_data:
+                fields = tuple([*elmt_data.keys()][1:])
+                rows_by_fields.setdefault(fields, []).append(
+                    [self.gameID, *([*elmt_data.values()])[1:]]
+                )
+
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                for fields, rows in rows_by_fields.items():
                     query = sql.SQL(
                         "INSERT INTO iris.{table} (game_id,{fields}) VALUES ({values});"
                     ).format(
                         table=sql.Identifier(field),
                         fields=sql.SQL(",").join(
-                            sql.Identifier(nfield) for nfield in ([*elmt_data.keys()])[1:]
+                            sql.Identifier(nfield) for nfield in fields
                         ),
-                        values=sql.SQL(", ").join(sql.Placeholder() * len(elmt_data)),
+                        values=sql.SQL(", ").join(sql.Placeholder() * (len(fields) + 1)),
                     )
-                    data = [self.gameID, *([*elmt_data.values()])[1:]]
-                    
-                    await cur.execute(query, data)
+
+                    await self.executemany(cur, query, rows)
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding normalized data to game ID {self.gameID}"
@@ -404,60 +495,43 @@ class IrisDalNewGame:
         """
         
         try :
-            async with self.iris_aconn.cursor() as cur:
-                for elmt_data in field_data:
-                    query = sql.SQL(
-                        """INSERT INTO iris.{table} (name, slug)
-                            VALUES (%s, %s)
-                            ON CONFLICT (name) DO NOTHING
-                            RETURNING id;
-                            """
-                    ).format(
-                        table=sql.Identifier(field),
-                    )
-                    data = (
-                        elmt_data.get("name"),
-                        elmt_data.get("slug"),
-                    )
-                    
-                    await cur.execute(query, data)
-                    res = await cur.fetchone()
-                    
-                    if res is None:
-                        query = sql.SQL(
-                            """SELECT id FROM iris.{table}
-                                WHERE name = %s;
-                                """
-                        ).format(
-                            table=sql.Identifier(field),
-                        )
-                        data = (
-                            elmt_data.get("name"),
-                        )
-                        
-                        await cur.execute(query, data)
-                        field_id = (await cur.fetchone()).get("id", None)
-                    else:
-                        field_id = res.get("id")
-                        
-                    field_id_column = field + "_id"
-                    query = sql.SQL(
-                        """INSERT INTO iris.{table} (game_id, {field})
-                            VALUES (%s, %s)
-                            ON CONFLICT DO NOTHING;
-                            """
-                    ).format(
-                        table=sql.Identifier(association_table),
-                        field=sql.Identifier(field_id_column),
-                    )
-                    
-                    data = (
-                        self.gameID,
-                        field_id,
+            # Names must be unique in the batch, an upsert can't update a row twice
+            # Sorted so that concurrent ingests lock the rows in the same order
+            elmts = {
+                elmt_data.get("name"): elmt_data.get("slug")
+                for elmt_data in sorted(field_data, key=lambda elmt: elmt.get("name"))
+            }
+            if not elmts:
+                return
+
+            async with connectors.iris_connection() as aconn, aconn.cursor() as cur:
+                # The no-op update makes RETURNING yield existing rows as well as new ones
+                field_id_column = field + "_id"
+                query = sql.SQL(
+                    """--begin-sql
+                    WITH elmts AS (
+                        INSERT INTO iris.{field_table} (name, slug)
+                            SELECT * FROM unnest(%s::text[], %s::text[])
+                        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+                        RETURNING id
                     )
-                    
-                    await cur.execute(query, data)
-                    
+                    INSERT INTO iris.{table} (game_id, {field})
+                        SELECT %s, elmts.id FROM elmts
+                    ON CONFLICT DO NOTHING;
+                    """
+                ).format(
+                    table=sql.Identifier(association_table),
+                    field=sql.Identifier(field_id_column),
+                    field_table=sql.Identifier(field),
+                )
+                data = (
+                    [*elmts.keys()],
+                    [*elmts.values()],
+                    self.gameID,
+                )
+
+                await self.execute(cur, query, data)
+
         except psycopg_Error as exc:
             raise SQLError(
                 f"An error occurred while adding association table data to game ID {self.gameID}"
@@ -0,0 +1,669 @@
+import time
+from collections import defaultdict
+
+from psycopg import AsyncCursor, sql
+
+from app.internal.IRIS.iris_db_connection import IRIS_PREPARED_STATEMENTS
+
+
+class StatementRegistry:
+    """Named SQL statements of the IRIS Data Access Layer, declared once at import.
+    Each variant of a statement (one per set of dynamic parts, e.g. sort order)
+    is rendered once, then executed as a server-side prepared statement so
+    repeated calls skip parsing and planning.
+    """
+
+    def __init__(self, prepare: bool = IRIS_PREPARED_STATEMENTS) -> None:
+        self.prepare = prepare
+        self.templates: dict[str, sql.Composable] = {}
+        self.rendered: dict[tuple, str] = {}
+        self.stats = defaultdict(lambda: {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def register(self, name: str, query: str | sql.Composable) -> None:
+        """Declare a named statement
+
+        Args:
+            name (str): Statement name
+            query (str | sql.Composable): Statement, may contain {part} placeholders
+                filled at execution
+
+        Raises:
+            ValueError: A statement with the same name is already registered
+        """
+        if name in self.templates:
+            raise ValueError(f"Statement [{name}] is already registered")
+
+        self.templates[name] = sql.SQL(query) if isinstance(query, str) else query
+
+    def render(self, curs: AsyncCursor, name: str, parts: dict) -> str:
+        """Get the query text of a statement variant, rendering it on first use
+
+        Args:
+            curs (AsyncCursor): Cursor used to quote identifiers
+            name (str): Statement name
+            parts (dict): Dynamic parts, SQL text or sql.Composable by placeholder name
+
+        Returns:
+            str: Query text
+        """
+        key = (name, *sorted((part, repr(value)) for part, value in parts.items()))
+        query = self.rendered.get(key)
+
+        if query is None:
+            template = self.templates[name]
+            if parts:
+                template = template.format(
+                    **{
+                        part: sql.SQL(value) if isinstance(value, str) else value
+                        for part, value in parts.items()
+                    }
+                )
+            query = template.as_string(curs)
+            self.rendered[key] = query
+
+        return query
+
+    async def execute(
+        self, curs: AsyncCursor, name: str, params=None, **parts
+    ) -> AsyncCursor:
+        """Execute a named statement
+
+        Args:
+            curs (AsyncCursor): Cursor to execute the statement with
+            name (str): Statement name
+            params (tuple | dict, optional): Query parameters. Defaults to None.
+            parts (str | sql.Composable): Dynamic parts of the statement
+
+        Returns:
+            AsyncCursor: The cursor, ready to fetch
+        """
+        query = self.render(curs, name, parts)
+
+        start = time.perf_counter()
+        await curs.execute(query, params, prepare=self.prepare)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        stats = self.stats[name]
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed
+        stats["max_ms"] = max(stats["max_ms"], elapsed)
+        return curs
+
+    def get_stats(self) -> dict:
+        """Get the execution time counters of every statement, compare them with
+            IRIS_PREPARED_STATEMENTS on and off to measure the parse / plan time saved
+
+        Returns:
+            dict: Prepare switch, number of rendered variants and counters by statement
+        """
+        return {
+            "prepare": self.prepare,
+            "variants": len(self.rendered),
+            "statements": {
+                name: {**stats, "avg_ms": stats["total_ms"] / stats["calls"]}
+                for name, stats in self.stats.items()
+            },
+        }
+
+
+iris_statements = StatementRegistry()
+
+
+# --------------------Game-------------------- #
+
+iris_statements.register(
+    "check_game_existence", "SELECT g.complete FROM iris.game g WHERE id=%s;"
+)
+
+iris_statements.register(
+    "check_games_existence",
+    "SELECT g.id, g.complete FROM iris.game g WHERE g.id = ANY(%s);",
+)
+
+iris_statements.register(
+    "delete_game_table", "DELETE FROM iris.{table} WHERE game_id = %s;"
+)
+
+iris_statements.register("hard_delete_game", "DELETE FROM iris.game WHERE id=%s;")
+
+iris_statements.register(
+    "soft_delete_game",
+    """
+    --begin-sql
+    UPDATE iris.game
+        SET category = null, collection_id = null,
+            complete = false, first_release_date = null, parent_game = null,
+            rating = null, slug = null, summary = null
+        WHERE id=%s;""",
+)
+
+iris_statements.register(
+    "get_full_game_data",
+    """--begin-sql
+    SELECT
+        g.id,
+        g.name,
+        g.complete,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        g.parent_game,
+        g.collection_id,
+        c2.name AS collection_name,
+        g.first_release_date,
+        round(g.rating::numeric, 2) AS rating,
+        g.popularity,
+        g.summary,
+        c.name AS TYPE,
+        a.id AS main_album_id
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            ON
+        m.game_id = g.id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        a.game_id = g.id
+        AND a.is_main
+        AND a.is_visible
+    LEFT JOIN
+        iris.category c
+            ON
+        c.id = g.category
+    LEFT JOIN
+        iris.collection c2
+            ON
+        c2.id = g.collection_id
+    WHERE
+        g.id = %s;""",
+)
+
+iris_statements.register(
+    "get_game_page",
+    """--begin-sql
+    SELECT
+        g.id,
+        g.name,
+        g.complete,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        g.parent_game,
+        g.collection_id,
+        c2.name AS collection_name,
+        g.first_release_date,
+        round(g.rating::numeric, 2) AS rating,
+        g.popularity,
+        g.summary,
+        c.name AS TYPE,
+        a.id AS main_album_id
+        {sections}
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            ON
+        m.game_id = g.id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        a.game_id = g.id
+        AND a.is_main
+        AND a.is_visible
+    LEFT JOIN
+        iris.category c
+            ON
+        c.id = g.category
+    LEFT JOIN
+        iris.collection c2
+            ON
+        c2.id = g.collection_id
+    WHERE
+        g.id = %(game_id)s;""",
+)
+
+iris_statements.register(
+    "get_games_sorted",
+    """--begin-sql
+    SELECT
+        {sort_type} AS cursor_key,
+        g.id,
+        g.name,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        a.id AS main_album_id
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            ON
+        m.game_id = g.id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        a.game_id = g.id
+        AND a.is_main
+        AND a.is_visible
+    WHERE
+        g.complete
+        {keyset}
+    ORDER BY cursor_key {sort_order}, g.id {sort_order}
+    OFFSET %(offset)s
+    LIMIT %(limit)s;""",
+)
+
+GAMES_RANDOM_SEGMENT = """--begin-sql
+    SELECT
+        g.random_key AS cursor_key,
+        g.id,
+        g.name,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        a.id AS main_album_id
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            ON
+        m.game_id = g.id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        a.game_id = g.id
+        AND a.is_main
+        AND a.is_visible
+    WHERE
+        g.complete
+        AND g.random_key < %s
+        AND (g.random_key, g.id) > (%s, %s)
+    ORDER BY g.random_key, g.id
+    LIMIT %s"""
+
+iris_statements.register(
+    "get_games_random",
+    sql.SQL(
+        """--begin-sql
+        SELECT * FROM (
+            ({segment})
+            UNION ALL
+            ({segment})
+        ) games
+        OFFSET %s
+        LIMIT %s;"""
+    ).format(segment=sql.SQL(GAMES_RANDOM_SEGMENT)),
+)
+
+iris_statements.register(
+    "get_reduced_game_data",
+    """--begin-sql
+    SELECT
+        g.id,
+        g.name,
+        m.image_id as cover_id,
+        m.blur_hash as cover_hash,
+        a.id as album_id
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            on m.game_id = g.id
+            and m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            on a.game_id = g.id
+            and a.is_main
+            and a.is_visible
+    WHERE
+        g.id = %s;""",
+)
+
+iris_statements.register(
+    "get_categories_by_game_id",
+    """--begin-sql
+    SELECT
+        t.id,
+        t.name,
+        t.slug
+    FROM
+        iris.theme t
+    LEFT JOIN
+        iris.game_theme gt
+            ON
+        gt.theme_id = t.id
+    WHERE
+        gt.game_id = %s;""",
+)
+
+iris_statements.register(
+    "get_game_top_tracks",
+    """--begin-sql
+    SELECT
+        t.play_count AS cursor_key,
+        t.id AS track_id,
+        at2.album_id,
+        t.title,
+        t.slug,
+        t.file_id AS mpd,
+        t.like_count,
+        t.play_count,
+        t.last_played,
+        t.length
+    FROM
+        iris.track t
+    LEFT JOIN
+        iris.album_track at2
+        ON
+        at2.track_id = t.id
+    INNER JOIN
+        iris.album a
+        ON
+        a.id = at2.album_id
+        AND
+        a.is_main
+    WHERE
+        t.game_id = %(game_id)s
+        {keyset}
+    ORDER BY
+        t.play_count desc, t.id desc
+    OFFSET %(offset)s
+    LIMIT %(limit)s;""",
+)
+
+iris_statements.register(
+    "get_games_albums",
+    """--begin-sql
+    SELECT
+        a.id AS album_id,
+        a."name" ,
+        a.slug ,
+        a.is_certified ,
+        a.is_main ,
+        a.created_at ,
+        a.like_count
+    FROM
+        iris.album a
+    WHERE
+        a.game_id  = %s;""",
+)
+
+iris_statements.register(
+    "get_game_related_games",
+    """--begin-sql
+    SELECT
+        ec.extra_id,
+        g.name,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        a.id AS main_album_id
+    FROM
+        iris.extra_content AS ec
+    LEFT JOIN iris.game g ON
+        g.id = ec.extra_id
+    LEFT JOIN iris.media m ON
+        m.game_id = ec.extra_id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        ec.extra_id  = a.game_id
+        AND a.is_main
+        AND a.is_visible
+    WHERE ec.game_id = %s AND ec."type" = 'similar_game'
+    OFFSET %s
+    LIMIT %s;""",
+)
+
+
+# --------------------Album-------------------- #
+
+iris_statements.register("get_next_album_id", "SELECT MAX(id) FROM iris.album;")
+
+iris_statements.register(
+    "check_album_existence", "SELECT id FROM iris.album WHERE game_id=%s AND name=%s;"
+)
+
+iris_statements.register(
+    "insert_album_source",
+    """INSERT INTO iris.album_source(name, media_type, url)
+        VALUES (%s,%s,%s) RETURNING id;""",
+)
+
+iris_statements.register(
+    "insert_album",
+    """INSERT INTO iris.album (id, game_id, name, slug, is_main, is_visible, source_id)
+    VALUES (%s,%s,%s,%s,%s,%s,%s);""",
+)
+
+iris_statements.register(
+    "insert_track",
+    """INSERT INTO iris.track
+            (game_id, title, slug, file_id, length)
+    VALUES (%s,%s,%s,%s,%s) RETURNING id;""",
+)
+
+iris_statements.register(
+    "insert_album_track",
+    "INSERT INTO iris.album_track (album_id, track_id) VALUES (%s,%s);",
+)
+
+iris_statements.register(
+    "get_album_details_by_id",
+    """--begin-sql
+    SELECT
+        a."name",
+        a.slug,
+        a.game_id,
+        a.is_certified,
+        a.is_main,
+        a.created_at,
+        a.like_count
+    FROM iris.album a
+    WHERE a.id = %s;""",
+)
+
+iris_statements.register(
+    "get_album_tracks_by_id",
+    """--begin-sql
+    SELECT
+        at2.track_id,
+        t.title,
+        t.slug,
+        t.file_id,
+        t.like_count,
+        t.play_count,
+        t.last_played,
+        t.length
+    FROM
+        iris.album_track at2
+    LEFT JOIN
+        iris.track t
+        ON at2.track_id = t.id
+    WHERE
+        at2.album_id = %s;""",
+)
+
+
+# --------------------Collection-------------------- #
+
+iris_statements.register(
+    "get_collection_info_by_id",
+    """--begin-sql
+    SELECT
+        c."name" AS collection_name,
+        coalesce(cs.n_games, 0) AS n_games,
+        coalesce(cs.n_tracks, 0) AS n_tracks
+    FROM
+        iris.collection c
+    LEFT JOIN iris.collection_stats cs
+        ON cs.collection_id = c.id
+    WHERE c.id = %s;""",
+)
+
+iris_statements.register(
+    "get_collection_reduce_game_info",
+    """--begin-sql
+    SELECT
+        g.id,
+        g.name,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        a.id AS main_album_id
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            ON
+        m.game_id = g.id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        a.game_id = g.id
+        AND a.is_main
+        AND a.is_visible
+    WHERE
+        g.collection_id = %s;""",
+)
+
+iris_statements.register(
+    "get_collections_reduce_game_info",
+    """--begin-sql
+    SELECT
+        g.collection_id,
+        g.id,
+        g.name,
+        m.image_id AS cover_id,
+        m.blur_hash AS cover_hash,
+        a.id AS main_album_id
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.media m
+            ON
+        m.game_id = g.id
+        AND m.type = 'cover'
+    LEFT JOIN
+        iris.album a
+            ON
+        a.game_id = g.id
+        AND a.is_main
+        AND a.is_visible
+    WHERE
+        g.collection_id = ANY(%s);""",
+)
+
+iris_statements.register(
+    "get_collection_top_tracks",
+    """--begin-sql
+    SELECT
+        t.play_count AS cursor_key,
+        t.id AS track_id,
+        at2.album_id,
+        t.title,
+        t.slug,
+        t.file_id AS mpd,
+        t.like_count,
+        t.play_count,
+        t.last_played,
+        t.length
+    FROM
+        iris.game g
+    LEFT JOIN
+        iris.track t
+        ON t.game_id = g.id
+    LEFT JOIN
+        iris.album_track at2
+        ON
+        at2.track_id = t.id
+    INNER JOIN
+        iris.album a
+        ON
+        a.id = at2.album_id
+        AND
+        a.is_main
+    WHERE
+        g.collection_id = %(collection_id)s
+        {keyset}
+    ORDER BY
+        t.play_count desc, t.id desc
+    OFFSET %(offset)s
+    LIMIT %(limit)s;""",
+)
+
+iris_statements.register(
+    "get_collections_sorted",
+    """--begin-sql
+    SELECT
+        {sort_type} AS cursor_key,
+        c.id,
+        c.name,
+        cs.n_games,
+        cs.avg_rating,
+        cs.latest_game_release_date,
+        cs.n_tracks
+    FROM
+        iris.collection_stats cs
+    INNER JOIN iris.collection c
+        ON c.id = cs.collection_id
+    WHERE cs.n_games >= %(min_games)s
+        {keyset}
+    ORDER BY cursor_key {sort_order}, cs.collection_id {sort_order}
+    OFFSET %(offset)s
+    LIMIT %(limit)s;""",
+)
+
+COLLECTIONS_RANDOM_SEGMENT = """--begin-sql
+    SELECT
+        cs.random_key AS cursor_key,
+        c.id,
+        c.name,
+        cs.n_games,
+        cs.avg_rating,
+        cs.latest_game_release_date,
+        cs.n_tracks
+    FROM
+        iris.collection_stats cs
+    INNER JOIN iris.collection c
+        ON c.id = cs.collection_id
+    WHERE cs.n_games >= %s
+        AND cs.random_key < %s
+        AND (cs.random_key, cs.collection_id) > (%s, %s)
+    ORDER BY cs.random_key, cs.collection_id
+    LIMIT %s"""
+
+iris_statements.register(
+    "get_collections_random",
+    sql.SQL(
+        """--begin-sql
+        SELECT * FROM (
+            ({segment})
+            UNION ALL
+            ({segment})
+        ) collections
+        OFFSET %s
+        LIMIT %s;"""
+    ).format(segment=sql.SQL(COLLECTIONS_RANDOM_SEGMENT)),
+)
+
+
+# --------------------Search-------------------- #
+
+iris_statements.register(
+    "search_games",
+    """SELECT * FROM iris.search_games(
+        %s::text,
+        %s::int[],
+        %s::int[],
+        %s::text[],
+        %s::real,
+        %s::real,
+        %s::date,
+        %s::date,
+        %s::int,
+        %s::int,
+        %s::int);""",
+)
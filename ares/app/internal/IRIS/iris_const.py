@@ -1,3 +1,5 @@
+import os
+
 GAME_TABLES = [
     "album",
     "alternative_name",
@@ -8,4 +10,26 @@ GAME_TABLES = [
     "game_keyword",
     "game_theme",
     "track"
-]
\ No newline at end of file
+]
+
+# Time to live (in seconds) of the cached IRIS API wrapper results
+CACHE_TTL = {
+    "game": 3600,
+    "game_page": 600,
+    "games_sorted": 300,
+    "game_top_tracks": 600,
+    "game_albums": 3600,
+    "game_related_games": 3600,
+    "collection": 1800,
+    "collection_top_tracks": 600,
+    "collections_sorted": 600,
+    "album": 3600,
+}
+
+
+# Delay (in seconds) before refreshing the collection statistics after a write,
+# every write within this window is covered by the same refresh
+COLLECTION_STATS_REFRESH_DELAY = 5
+
+# Send the statements of a game ingest in psycopg pipeline mode (opt-in)
+IRIS_INGEST_PIPELINE = os.getenv("IRIS_INGEST_PIPELINE", "false").lower() == "true"
@@ -3,37 +3,116 @@ import os
 from dotenv import load_dotenv
 
 import psycopg
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
 
 from app.utils.loggers import base_logger as logger, get_database_logger
 
 # Impossible to use this logger because it's not async
-# sql_logger, LoggingConnection = get_database_logger() 
+# sql_logger, LoggingConnection = get_database_logger()
 load_dotenv()
 
 IRIS_HOST = os.getenv("POSTGRES_HOST")
+IRIS_DSN = make_conninfo(
+    user="postgres",
+    password=os.getenv("POSTGRES_PASSWORD"),
+    host=IRIS_HOST,
+    port="5432",
+)
 
-class IrisAsyncConnection():
-    def __init__(self):
-        self.conn = None
+IRIS_POOL_MIN_SIZE = int(os.getenv("IRIS_POOL_MIN_SIZE", "2"))
+IRIS_POOL_MAX_SIZE = int(os.getenv("IRIS_POOL_MAX_SIZE", "10"))
+IRIS_POOL_TIMEOUT = float(os.getenv("IRIS_POOL_TIMEOUT", "10"))
+
+# Server-side prepared statements: registered statements are prepared on first
+# use, other queries once executed IRIS_PREPARE_THRESHOLD times on a connection.
+# Turn off to measure the parse / plan time saved, or behind a pooler in
+# transaction mode that does not support them.
+IRIS_PREPARED_STATEMENTS = os.getenv("IRIS_PREPARED_STATEMENTS", "true").lower() == "true"
+IRIS_PREPARE_THRESHOLD = int(os.getenv("IRIS_PREPARE_THRESHOLD", "5"))
+
+# Public catalog reads can target a streaming replica or a pgbouncer endpoint
+IRIS_READ_DSN = os.getenv("IRIS_READ_DSN") or IRIS_DSN
+IRIS_READ_POOL_MIN_SIZE = int(os.getenv("IRIS_READ_POOL_MIN_SIZE", "2"))
+IRIS_READ_POOL_MAX_SIZE = int(os.getenv("IRIS_READ_POOL_MAX_SIZE", "20"))
+
+
+async def configure_read_only(conn: AsyncConnection) -> None:
+    """Reject any write on connections of the read-only pool"""
+    await conn.execute("SET default_transaction_read_only = on;")
+
+
+class IrisAsyncConnectionPool():
+    """Sized pool of async connections to the IRIS database"""
+
+    def __init__(
+        self,
+        conninfo: str = IRIS_DSN,
+        min_size: int = IRIS_POOL_MIN_SIZE,
+        max_size: int = IRIS_POOL_MAX_SIZE,
+        timeout: float = IRIS_POOL_TIMEOUT,
+        read_only: bool = False,
+        name: str = "iris",
+    ):
+        self.read_only = read_only
+        self.pool = AsyncConnectionPool(
+            conninfo,
+            kwargs={
+                "row_factory": dict_row,
+                # Read-only connections never hold a transaction open between queries
+                "autocommit": read_only,
+                "prepare_threshold": (
+                    IRIS_PREPARE_THRESHOLD if IRIS_PREPARED_STATEMENTS else None
+                ),
+            },
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            check=AsyncConnectionPool.check_connection,
+            configure=configure_read_only if read_only else None,
+            name=name,
+            open=False,
+        )
 
     async def connect_to_iris(self):
         try:
-            self.conn = await psycopg.AsyncConnection.connect(
-                user="postgres",
-                password=os.getenv("POSTGRES_PASSWORD"),
-                host=IRIS_HOST,
-                port="5432",
-                row_factory=dict_row,
-                autocommit=False,
+            await self.pool.open(wait=True)
+            logger.info(
+                "Connection pool [%s] to IRIS database established (min %s, max %s).",
+                self.pool.name,
+                self.pool.min_size,
+                self.pool.max_size,
             )
-            logger.info("Connection to IRIS database established.")
-        except psycopg.Error as e:
+        except (psycopg.Error, PoolTimeout) as e:
             logger.error("Error while connecting to IRIS: %s", e)
-            
+
     async def close(self):
-        await self.conn.close()
-        logger.info("Connection to IRIS database closed.")
-        
-    def get_conn(self):
-        return self.conn
+        await self.pool.close()
+        logger.info("Connection pool [%s] to IRIS database closed.", self.pool.name)
+
+    def get_pool(self) -> AsyncConnectionPool:
+        return self.pool
+
+    def get_stats(self) -> dict:
+        """Get the pool usage metrics (size, available connections, waiting
+            clients, connections served, wait times, errors...)
+
+        Returns:
+            dict: Pool metrics
+        """
+        return self.pool.get_stats()
+
+
+class IrisReadOnlyConnectionPool(IrisAsyncConnectionPool):
+    """Autocommit, read-only pool used for the public catalog reads"""
+
+    def __init__(self):
+        super().__init__(
+            conninfo=IRIS_READ_DSN,
+            min_size=IRIS_READ_POOL_MIN_SIZE,
+            max_size=IRIS_READ_POOL_MAX_SIZE,
+            read_only=True,
+            name="iris-read",
+        )
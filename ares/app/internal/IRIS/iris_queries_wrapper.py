@@ -1,9 +1,20 @@
+import asyncio
 import json
+import random
+import time
+from contextlib import nullcontext
 from typing import Literal
 import os
 import requests
 
 from app.internal.utilities.files import delete_folder, delete_file
+from app.internal.utilities.cache import iris_cache
+from app.internal.utilities.cursor import decode_cursor, paginate
+from app.internal.IRIS.iris_const import (
+    CACHE_TTL,
+    COLLECTION_STATS_REFRESH_DELAY,
+    IRIS_INGEST_PIPELINE,
+)
 
 import app.connectors as connectors
 
@@ -22,80 +33,162 @@ class Iris:
         with open("app/config/IGDB_IRIS_association.json", "r", encoding="utf-8") as f:
             self.igdb_iris_association: dict = json.load(f)
 
-    async def push_new_game(self, game_data: dict, game_existence: int) -> None:
+        self.collection_stats_refresh: asyncio.Task | None = None
+        # Set by every write, a refresh running when it is set started from an
+        # older snapshot and is followed by another one
+        self.collection_stats_dirty = False
+
+    def schedule_collection_stats_refresh(self) -> None:
+        """Refresh the collection statistics after a short delay, coalescing the
+            refresh requests of a burst of writes (e.g. bulk ingest) into one
+        """
+        self.collection_stats_dirty = True
+        if self.collection_stats_refresh is None or self.collection_stats_refresh.done():
+            self.collection_stats_refresh = asyncio.create_task(
+                self.refresh_collection_stats()
+            )
+
+    async def refresh_collection_stats(self) -> None:
+        """Refresh the collection statistics and drop the cached collections, until
+            no write was committed during the last refresh
+        """
+        # Never reuse the connection of the request that scheduled the refresh
+        connectors.iris_aconn.set(None)
+
+        while self.collection_stats_dirty:
+            await asyncio.sleep(COLLECTION_STATS_REFRESH_DELAY)
+            self.collection_stats_dirty = False
+            try:
+                await self.iris_dal.refresh_collection_stats()
+            except SQLError as error:
+                logger.error("Error while refreshing collection statistics: %s", error)
+                continue
+
+            await iris_cache.invalidate_tags("collections")
+
+    async def push_new_game(
+        self, game_data: dict, game_existence: int, pipeline: bool = IRIS_INGEST_PIPELINE
+    ) -> None:
         """Push new game to database
 
         Args:
             game_data (dict): Game data
+            game_existence (int): Game existence status (see check_game_existence)
+            pipeline (bool, optional): Send the statements of the transaction in
+                psycopg pipeline mode, without waiting for each reply. Errors are
+                then raised at the next synchronization point, possibly by a later
+                handler. Defaults to IRIS_INGEST_PIPELINE.
         """
 
         game_id = game_data[0]["id"]
         game_name = game_data[0]["name"]
         logger.info("Adding game [%s] to database.", game_id)
+        start = time.perf_counter()
+
+        new_game_dal = self.iris_dal.IrisDalNewGame(self.iris_dal, game_id)
+        # Network calls are made first so that the transaction, and the row locks
+        # it takes on shared rows (genres, companies...), stays short
+        external_data = await self.fetch_external_game_data(new_game_dal, game_data[0])
+        fetched = time.perf_counter()
+
+        async with connectors.iris_connection() as aconn:
+            async with aconn.pipeline() if pipeline else nullcontext(), aconn.transaction():
+                if game_existence == 0:
+                    await new_game_dal.add_new_game_root_data(game_id, game_name)
+
+                for field in game_data[0]:
+                    field_data = game_data[0][field]
+                    field_schema_data: dict = self.igdb_iris_association.get(field)
+                    field_type: str = field_schema_data.get("type")
+                    field_sql_identifier = field_schema_data.get("field")
+
+                    match field_type:
+                        case "base":
+                            await new_game_dal.add_base_data(
+                                field_sql_identifier, field_data
+                            )
+                        case "date":
+                            await new_game_dal.add_date_data(
+                                field_sql_identifier, field_data
+                            )
+                        case "parent":
+                            await new_game_dal.add_parent_data(
+                                field_sql_identifier, field_data
+                            )
+                        case "extra":
+                            await new_game_dal.add_extra_data(
+                                field_sql_identifier,
+                                field_data,
+                                field_schema_data.get("sub_field"),
+                            )
+                        case "base-ext":
+                            await new_game_dal.add_base_extra_data(
+                                field_sql_identifier,
+                                field_schema_data.get("base_field"),
+                                field_data,
+                            )
+                        case "company":
+                            await new_game_dal.add_company_data(
+                                field_sql_identifier,
+                                field_schema_data.get("sub_field"),
+                                field_data,
+                                external_data[field],
+                            )
+                        case "media":
+                            await new_game_dal.add_media_data(
+                                field_sql_identifier, field, field_data, external_data[field]
+                            )
+                        case "normal":
+                            await new_game_dal.add_normalized_data(
+                                field_sql_identifier, field_data
+                            )
+                        case "association_table":
+                            await new_game_dal.add_association_table_data(
+                                field_sql_identifier,
+                                field_data,
+                                field_schema_data.get("association_table"),
+                            )
+
+                await new_game_dal.finalize_game()
+
+            await new_game_dal.commit_changes()
+
+        await iris_cache.invalidate_tags(f"game:{game_id}", "games", "collections")
+        self.schedule_collection_stats_refresh()
+
+        logger.info(
+            "Game [%s] added to database in %.0f ms, transaction %.0f ms (%s round-trips%s).",
+            game_id,
+            (time.perf_counter() - start) * 1000,
+            (time.perf_counter() - fetched) * 1000,
+            new_game_dal.round_trips,
+            ", pipelined" if pipeline else "",
+        )
+
+    async def fetch_external_game_data(self, new_game_dal, game_data: dict) -> dict:
+        """Fetch the data a game needs from outside the database: involved
+            companies from IGDB and media images, concurrently
+
+        Args:
+            new_game_dal (IrisDalNewGame): DAL of the game being pushed
+            game_data (dict): Game data
 
-        async with connectors.iris_aconn.transaction():
-            new_game_dal = self.iris_dal.IrisDalNewGame(self.iris_dal, game_id)
-
-            if game_existence == 0:
-                await new_game_dal.add_new_game_root_data(game_id, game_name)
-
-            for field in game_data[0]:
-                field_data = game_data[0][field]
-                field_schema_data: dict = self.igdb_iris_association.get(field)
-                field_type: str = field_schema_data.get("type")
-                field_sql_identifier = field_schema_data.get("field")
-
-                match field_type:
-                    case "base":
-                        await new_game_dal.add_base_data(
-                            field_sql_identifier, field_data
-                        )
-                    case "date":
-                        await new_game_dal.add_date_data(
-                            field_sql_identifier, field_data
-                        )
-                    case "parent":
-                        await new_game_dal.add_parent_data(
-                            field_sql_identifier, field_data
-                        )
-                    case "extra":
-                        await new_game_dal.add_extra_data(
-                            field_sql_identifier,
-                            field_data,
-                            field_schema_data.get("sub_field"),
-                        )
-                    case "base-ext":
-                        await new_game_dal.add_base_extra_data(
-                            field_sql_identifier,
-                            field_schema_data.get("base_field"),
-                            field_data,
-                        )
-                    case "company":
-                        await new_game_dal.add_company_data(
-                            field_sql_identifier,
-                            field_schema_data.get("sub_field"),
-                            field_data,
-                        )
-                    case "media":
-                        await new_game_dal.add_media_data(
-                            field_sql_identifier, field, field_data
-                        )
-                    case "normal":
-                        await new_game_dal.add_normalized_data(
-                            field_sql_identifier, field_data
-                        )
-                    case "association_table":
-                        await new_game_dal.add_association_table_data(
-                            field_sql_identifier,
-                            field_data,
-                            field_schema_data.get("association_table"),
-                        )
-
-            await new_game_dal.finalize_game()
-
-        await new_game_dal.commit_changes()
-
-        logger.info("Game [%s] added to database.", game_id)
+        Returns:
+            dict: Companies data or blurhashes by image ID, by field
+        """
+        fields, fetches = [], []
+        for field, field_data in game_data.items():
+            field_schema_data: dict = self.igdb_iris_association.get(field)
+            match field_schema_data.get("type"):
+                case "company":
+                    fetches.append(new_game_dal.fetch_companies(field_data))
+                case "media":
+                    fetches.append(new_game_dal.download_media(field, field_data))
+                case _:
+                    continue
+            fields.append(field)
+
+        return dict(zip(fields, await asyncio.gather(*fetches)))
 
     async def delete_game(self, game_id: int) -> None:
         """Delete game from database and media server
@@ -119,10 +212,15 @@ class Iris:
             )
 
             await self.iris_dal.delete_game(game_id)
+            await iris_cache.invalidate_tags(
+                f"game:{game_id}", "games", "collections", "albums"
+            )
+            self.schedule_collection_stats_refresh()
         except SQLError as error:
             logger.error("Error while getting game images: %s", error)
             return None
 
+    @iris_cache.cached("game", CACHE_TTL["game"], lambda game_id: [f"game:{game_id}"])
     async def get_base_game_data(self, game_id: int) -> dict:
         """Get base game data
 
@@ -138,6 +236,34 @@ class Iris:
 
         return base_data
 
+    @iris_cache.cached(
+        "game_page",
+        CACHE_TTL["game_page"],
+        lambda game_id, *_: [f"game:{game_id}", "games"],
+    )
+    async def get_game_page(
+        self,
+        game_id: int,
+        sections: list[str],
+        top_tracks_limit: int = 10,
+        related_games_limit: int = 10,
+    ) -> dict:
+        """Get everything the game page needs in a single database round-trip
+
+        Args:
+            game_id (int): Game ID
+            sections (list[str]): Sections to include (categories, top_tracks,
+                albums, related_games)
+            top_tracks_limit (int): limit of top tracks (default 10, max 50)
+            related_games_limit (int): limit of related games (default 10, max 50)
+
+        Returns:
+            dict: Base game data with the requested sections
+        """
+        return await self.iris_dal.get_game_page(
+            game_id, sections, top_tracks_limit, related_games_limit
+        )
+
     async def add_game_tracks(
         self, game_id: int, album_id: str, tracks: list, video_id: str
     ) -> None:
@@ -162,45 +288,96 @@ class Iris:
             game_id, album_id, tracks, "youtube", video_id
         )
 
+        await iris_cache.invalidate_tags(f"game:{game_id}", "collections", "albums")
+        self.schedule_collection_stats_refresh()
+
         delete_file(f"/bacchus/audio/tmp/{video_id}.opus")
 
+    @iris_cache.cached(
+        "games_sorted",
+        CACHE_TTL["games_sorted"],
+        lambda *_: ["games"],
+        condition=lambda sort_type, *_: sort_type != "random",
+    )
     async def get_games_sorted(
         self,
         sort_type: Literal["rating", "random", "recent"],
         sort_order: Literal["asc", "desc"],
         offset: int = 0,
         limit: int = 20,
-    ) -> list:
+        cursor: str = None,
+        seed: int = 0,
+    ) -> tuple[list, str | None]:
         """Get games sorted by a specific type (rating, random, recent)
 
         Args:
             sort_type (str): Field to sort by
+            sort_order (str): Sort order (asc, desc), ignored for random
+            offset (int): offset in results, applied after the cursor (default 0)
+            limit (int): limit of results (default 20)
+            cursor (str, optional): Cursor of the page to get. Defaults to None (first page).
+            seed (int, optional): Seed of the random order, the same seed gives the
+                same order across pages. Defaults to 0.
 
         Returns:
-            list: Games data
+            tuple[list, str | None]: Games data and next page cursor
         """
-        
+
+        if sort_type == "random":
+            signature = f"games:random:{seed}"
+            cursor_key = decode_cursor(cursor, signature) if cursor else None
+
+            games = await self.iris_dal.get_games_random(
+                random.Random(seed).random(), cursor_key, offset, limit
+            )
+
+            return paginate(games, limit, signature)
+
         sort_type_map = {
-            "rating": "g.rating",
-            "random": "random()",
-            "recent": "g.first_release_date",
+            "rating": "coalesce(g.rating, -1)",
+            "recent": "coalesce(g.first_release_date, '0001-01-01'::date)",
         }
+        signature = f"games:{sort_type}:{sort_order}"
+        key_type = "date" if sort_type == "recent" else "number"
+        cursor_key = decode_cursor(cursor, signature, key_type) if cursor else None
 
-        return await self.iris_dal.get_games_sorted(
-            sort_type_map[sort_type], sort_order, offset, limit
+        games = await self.iris_dal.get_games_sorted(
+            sort_type_map[sort_type], sort_order, cursor_key, offset, limit
         )
 
-    async def get_game_top_tracks(self, game_id: int, offset: int, limit: int):
+        return paginate(games, limit, signature)
+
+    @iris_cache.cached(
+        "game_top_tracks",
+        CACHE_TTL["game_top_tracks"],
+        lambda game_id, *_: [f"game:{game_id}"],
+    )
+    async def get_game_top_tracks(
+        self, game_id: int, offset: int, limit: int, cursor: str = None
+    ) -> tuple[list, str | None]:
         """Get game top tracks
 
         Args:
             game_id (int): Game ID
+            offset (int): offset in results, applied after the cursor
+            limit (int): limit of results
+            cursor (str, optional): Cursor of the page to get. Defaults to None (first page).
 
         Returns:
-            list: Game top tracks
+            tuple[list, str | None]: Game top tracks and next page cursor
         """
-        return await self.iris_dal.get_game_top_tracks(game_id, offset, limit)
+        signature = f"game-top-tracks:{game_id}"
+        cursor_key = decode_cursor(cursor, signature) if cursor else None
 
+        tracks = await self.iris_dal.get_game_top_tracks(
+            game_id, cursor_key, offset, limit
+        )
+
+        return paginate(tracks, limit, signature, "track_id")
+
+    @iris_cache.cached(
+        "game_albums", CACHE_TTL["game_albums"], lambda game_id: [f"game:{game_id}"]
+    )
     async def get_games_albums(self, game_id: int):
         """Get game albums
 
@@ -212,6 +389,11 @@ class Iris:
         """
         return await self.iris_dal.get_games_albums(game_id)
 
+    @iris_cache.cached(
+        "game_related_games",
+        CACHE_TTL["game_related_games"],
+        lambda game_id, *_: [f"game:{game_id}", "games"],
+    )
     async def get_game_related_games(self, game_id: int, offset: int, limit: int):
         """Get game related games
 
@@ -225,6 +407,9 @@ class Iris:
         """
         return await self.iris_dal.get_game_related_games(game_id, offset, limit)
 
+    @iris_cache.cached(
+        "collection", CACHE_TTL["collection"], lambda *_: ["collections"]
+    )
     async def get_collection_by_id(self, collection_id: int):
         """Get collection by ID
 
@@ -235,6 +420,9 @@ class Iris:
             dict: Collection data
         """
         collection_data = await self.iris_dal.get_collection_info_by_id(collection_id)
+        if collection_data is None:
+            return None
+
         collection_reduce_game_data = (
             await self.iris_dal.get_collection_reduce_game_info(collection_id)
         )
@@ -243,23 +431,40 @@ class Iris:
 
         return collection_data
 
+    @iris_cache.cached(
+        "collection_top_tracks",
+        CACHE_TTL["collection_top_tracks"],
+        lambda *_: ["collections"],
+    )
     async def get_collection_top_tracks(
-        self, collection_id: int, offset: int, limit: int
-    ):
+        self, collection_id: int, offset: int, limit: int, cursor: str = None
+    ) -> tuple[list, str | None]:
         """Get collection top tracks
 
         Args:
             collection_id (int): Collection ID
-            offset (int): offset in results (default 0)
+            offset (int): offset in results, applied after the cursor (default 0)
             limit (int): limit of results (default 10, max 50)
+            cursor (str, optional): Cursor of the page to get. Defaults to None (first page).
 
         Returns:
-            list: Collection top tracks
+            tuple[list, str | None]: Collection top tracks and next page cursor
         """
-        return await self.iris_dal.get_collection_top_tracks(
-            collection_id, offset, limit
+        signature = f"collection-top-tracks:{collection_id}"
+        cursor_key = decode_cursor(cursor, signature) if cursor else None
+
+        tracks = await self.iris_dal.get_collection_top_tracks(
+            collection_id, cursor_key, offset, limit
         )
 
+        return paginate(tracks, limit, signature, "track_id")
+
+    @iris_cache.cached(
+        "collections_sorted",
+        CACHE_TTL["collections_sorted"],
+        lambda *_: ["collections"],
+        condition=lambda sort_type, *_: sort_type != "random",
+    )
     async def get_collections_sorted(
         self,
         sort_type: Literal["rating", "random", "recent"],
@@ -267,32 +472,55 @@ class Iris:
         min_games: int,
         offset: int = 0,
         limit: int = 20,
-    ):
+        cursor: str = None,
+        seed: int = 0,
+    ) -> tuple[list, str | None]:
         """Get collections sorted by a specific type (rating, random, recent)
 
         Args:
-            sort_type (str): Field to sort by
+            sort_order (str): Sort order (asc, desc), ignored for random
+            sort_order (str): Sort order (asc, desc)
+            min_games (int): Minimum number of games in the collections
+            offset (int): offset in results, applied after the cursor (default 0)
+            limit (int): limit of results (default 20)
+            cursor (str, optional): Cursor of the page to get. Defaults to None (first page).
+            seed (int, optional): Seed of the random order, the same seed gives the
+                same order across pages. Defaults to 0.
 
         Returns:
-            list: Collections data
+            tuple[list, str | None]: Collections data and next page cursor
         """
-        sort_type_map = {
-            "rating": "avg_rating",
-            "random": "random()",
-            "recent": "latest_game_release_date",
-        }
+        if sort_type == "random":
+            signature = f"collections:random:{min_games}:{seed}"
+            cursor_key = decode_cursor(cursor, signature) if cursor else None
 
-        collections = await self.iris_dal.get_collections_sorted(
-            sort_type_map[sort_type], sort_order, min_games, offset, limit
-        )
+            collections = await self.iris_dal.get_collections_random(
+                random.Random(seed).random(), min_games, cursor_key, offset, limit
+            )
+        else:
+            sort_type_map = {
+                "rating": "coalesce(cs.avg_rating, -1)",
+                "recent": "coalesce(cs.latest_game_release_date, '0001-01-01'::date)",
+            }
+            signature = f"collections:{sort_type}:{sort_order}:{min_games}"
+            key_type = "date" if sort_type == "recent" else "number"
+            cursor_key = decode_cursor(cursor, signature, key_type) if cursor else None
+
+            collections = await self.iris_dal.get_collections_sorted(
+                sort_type_map[sort_type], sort_order, min_games, cursor_key, offset, limit
+            )
+
+        collections, next_cursor = paginate(collections, limit, signature)
 
+        collections_games = await self.iris_dal.get_collections_reduce_game_info(
+            [collection["id"] for collection in collections]
+        )
         for collection in collections:
-            collection["games"] = await self.iris_dal.get_collection_reduce_game_info(
-                collection["id"]
-            )
+            collection["games"] = collections_games[collection["id"]]
 
-        return collections
+        return collections, next_cursor
 
+    @iris_cache.cached("album", CACHE_TTL["album"], lambda *_: ["albums"])
     async def get_album_by_id(self, album_id: str):
         """Get album by ID
 
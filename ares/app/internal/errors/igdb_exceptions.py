@@ -22,4 +22,16 @@ class IGDBInvalidReponse(Exception):
     
     def __init__(self, message = "Invalid response from IGDB API"):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+
+class IGDBTokenError(Exception):
+    """Exception raised when no IGDB access token can be obtained from Twitch.
+    
+    Attributes:
+        message -- explanation of the error
+    """
+    
+    def __init__(self, message = "Unable to get an IGDB access token"):
+        self.message = message
+        super().__init__(self.message)
@@ -16,7 +16,7 @@ def require_valid_token(route_function):
     async def wrapper(*args, **kwargs):
         request = kwargs.get('request')
         token = request.headers.get("Authorization")
-        if not token or admin_auth(token):
+        if not token or not admin_auth(token):
             raise HTTPException(status_code=403, detail="Invalid token")
         return await route_function(*args, **kwargs)
     return wrapper
@@ -0,0 +1,434 @@
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from functools import wraps
+from typing import Callable
+
+from redis.exceptions import RedisError
+
+import app.connectors as connectors
+
+from app.utils.connection import REDIS_ASYNC
+from app.utils.loggers import base_logger as logger
+
+IRIS_CACHE_LOCAL_MAX_BYTES = int(os.getenv("IRIS_CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+IRIS_CACHE_LOCAL_TTL = int(os.getenv("IRIS_CACHE_LOCAL_TTL", "30"))
+# Upper bound of the read replica lag (seconds). Reads finishing this soon after an
+# invalidation are not cached, and invalidations are repeated after this delay.
+IRIS_CACHE_REPLICA_LAG = float(os.getenv("IRIS_CACHE_REPLICA_LAG", "2"))
+
+# Key marking the python types that JSON can't represent in cache payloads
+CACHE_TYPE_KEY = "__cache_type__"
+CACHE_TYPES = {
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "time": dt_time.fromisoformat,
+    "timedelta": lambda value: timedelta(seconds=value),
+    "decimal": Decimal,
+    "uuid": uuid.UUID,
+    "tuple": tuple,
+}
+
+
+def encode_value(value):
+    """Convert a value to JSON compatible types, tagging the python types that
+        JSON can't represent"""
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [encode_value(item) for item in value]
+    if isinstance(value, tuple):
+        return {CACHE_TYPE_KEY: "tuple", "value": [encode_value(item) for item in value]}
+    # datetime is a subclass of date, it must be checked first
+    if isinstance(value, datetime):
+        return {CACHE_TYPE_KEY: "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {CACHE_TYPE_KEY: "date", "value": value.isoformat()}
+    if isinstance(value, dt_time):
+        return {CACHE_TYPE_KEY: "time", "value": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {CACHE_TYPE_KEY: "timedelta", "value": value.total_seconds()}
+    if isinstance(value, Decimal):
+        return {CACHE_TYPE_KEY: "decimal", "value": str(value)}
+    if isinstance(value, uuid.UUID):
+        return {CACHE_TYPE_KEY: "uuid", "value": str(value)}
+    return value
+
+
+def decode_object(obj: dict):
+    cache_type = obj.get(CACHE_TYPE_KEY)
+    if cache_type is None:
+        return obj
+    return CACHE_TYPES[cache_type](obj["value"])
+
+
+def dumps(value) -> bytes:
+    """Serialize a cache value. JSON is used rather than pickle, so that a
+        payload read from the shared Redis can never execute code.
+
+    Args:
+        value (Any): Value made of JSON types, tuples, dates, decimals and UUIDs
+
+    Returns:
+        bytes: Payload
+    """
+    return json.dumps(encode_value(value), separators=(",", ":")).encode()
+
+
+def loads(payload: bytes):
+    """Deserialize a cache payload
+
+    Args:
+        payload (bytes): Payload built by dumps
+
+    Returns:
+        Any: Cached value
+    """
+    return json.loads(payload, object_hook=decode_object)
+
+
+class LocalLRUCache:
+    """In-process LRU cache bounded by the total size in bytes of its payloads.
+    Payloads are kept serialized so that callers never share mutable objects.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.entries: OrderedDict[str, tuple[float, bytes, list[str]]] = OrderedDict()
+        self.tags: dict[str, set[str]] = defaultdict(set)
+
+    def get(self, key: str) -> bytes | None:
+        """Get a payload and mark it as most recently used
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bytes | None: Serialized payload or None on miss
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, payload, _ = entry
+        if expires_at < time.monotonic():
+            self.delete(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return payload
+
+    def set(self, key: str, payload: bytes, ttl: int, tags: list[str]) -> None:
+        """Store a payload, evicting the least recently used ones above the byte budget
+
+        Args:
+            key (str): Cache key
+            payload (bytes): Serialized payload
+            ttl (int): Time to live in seconds, capped by the local TTL
+            tags (list[str]): Invalidation tags of the payload
+        """
+        if len(payload) > self.max_bytes:
+            return
+
+        self.delete(key)
+        self.entries[key] = (time.monotonic() + min(ttl, self.ttl), payload, tags)
+        self.size += len(payload)
+        for tag in tags:
+            self.tags[tag].add(key)
+
+        while self.size > self.max_bytes:
+            self.delete(next(iter(self.entries)))
+
+    def delete(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        _, payload, tags = entry
+        self.size -= len(payload)
+        for tag in tags:
+            tag_keys = self.tags.get(tag)
+            if tag_keys is not None:
+                tag_keys.discard(key)
+                if not tag_keys:
+                    del self.tags[tag]
+
+    def invalidate_tags(self, tags: list[str]) -> None:
+        for tag in tags:
+            for key in list(self.tags.get(tag, ())):
+                self.delete(key)
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "size_bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class IrisCache:
+    """Two tier cache for the IRIS API queries wrapper results: a per-worker
+    LRU in front of the shared Redis cache.
+    Entries are serialized to JSON with type tags to keep python types (dates,
+    decimals) intact and are registered in tag sets so that writes can invalidate
+    every dependent entry.
+    Invalidations are broadcast through Redis pub/sub to keep every worker's
+    local tier coherent. As reads may come from a lagging replica, they are
+    repeated after IRIS_CACHE_REPLICA_LAG, and reads finishing within that
+    delay after an invalidation of one of their tags are not cached.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        prefix: str = "iris:cache",
+        local_max_bytes: int = IRIS_CACHE_LOCAL_MAX_BYTES,
+        local_ttl: int = IRIS_CACHE_LOCAL_TTL,
+    ) -> None:
+        self.redis = redis_client
+        self.prefix = prefix
+        self.channel = f"{prefix}:invalidate"
+        self.local = LocalLRUCache(local_max_bytes, local_ttl)
+        self.listener: asyncio.Task | None = None
+        # Last invalidation time of the recently invalidated tags, seen by this worker
+        self.invalidated_at: dict[str, float] = {}
+        self.delayed_invalidations: set[asyncio.Task] = set()
+        self.stats = defaultdict(
+            lambda: {"local_hits": 0, "hits": 0, "misses": 0, "errors": 0}
+        )
+
+    def make_key(self, name: str, *args, **kwargs) -> str:
+        """Build the cache key of a call
+
+        Args:
+            name (str): Cached endpoint name
+
+        Returns:
+            str: Cache key
+        """
+        parts = [str(arg) for arg in args]
+        parts += [f"{key}={value}" for key, value in sorted(kwargs.items())]
+        return ":".join([self.prefix, name, *parts])
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    async def get(self, name: str, key: str, ttl: int, tags: list[str]):
+        """Get a cached value from the local tier, then from Redis
+
+        Args:
+            name (str): Cached endpoint name
+            key (str): Cache key
+            ttl (int): Time to live in seconds, used to fill the local tier
+            tags (list[str]): Invalidation tags, used to fill the local tier
+
+        Returns:
+            Any: Cached value or None on miss
+        """
+        payload = self.local.get(key)
+        if payload is not None:
+            self.stats[name]["local_hits"] += 1
+            return loads(payload)
+
+        try:
+            payload = await self.redis.get(key)
+        except RedisError as exc:
+            self.stats[name]["errors"] += 1
+            logger.warning("Error while reading cache key [%s]: %s", key, exc)
+            return None
+
+        if payload is None:
+            self.stats[name]["misses"] += 1
+            return None
+
+        try:
+            value = loads(payload)
+        except (ValueError, KeyError) as exc:
+            # Entries written in another format (e.g. before an upgrade) are misses
+            self.stats[name]["errors"] += 1
+            logger.warning("Invalid payload for cache key [%s]: %s", key, exc)
+            return None
+
+        self.stats[name]["hits"] += 1
+        self.local.set(key, payload, ttl, tags)
+        return value
+
+    async def set(self, name: str, key: str, value, ttl: int, tags: list[str]) -> None:
+        """Store a value in cache and register it under its tags
+
+        Args:
+            name (str): Cached endpoint name
+            key (str): Cache key
+            value (Any): Value to cache
+            ttl (int): Time to live in seconds
+            tags (list[str]): Invalidation tags of the value
+        """
+        payload = dumps(value)
+        self.local.set(key, payload, ttl, tags)
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, payload, ex=ttl)
+                for tag in tags:
+                    pipe.sadd(self.tag_key(tag), key)
+                    pipe.expire(self.tag_key(tag), ttl, gt=True)
+                    pipe.expire(self.tag_key(tag), ttl, nx=True)
+                await pipe.execute()
+        except RedisError as exc:
+            self.stats[name]["errors"] += 1
+            logger.warning("Error while writing cache key [%s]: %s", key, exc)
+
+    def mark_invalidated(self, tags: list[str]) -> None:
+        now = time.monotonic()
+        if len(self.invalidated_at) > 10000:
+            self.invalidated_at = {
+                tag: at
+                for tag, at in self.invalidated_at.items()
+                if now - at < IRIS_CACHE_REPLICA_LAG
+            }
+        for tag in tags:
+            self.invalidated_at[tag] = now
+
+    def recently_invalidated(self, tags: list[str]) -> bool:
+        """Check if one of the tags was invalidated less than IRIS_CACHE_REPLICA_LAG ago
+
+        Args:
+            tags (list[str]): Invalidation tags
+
+        Returns:
+            bool: A value read now may come from a replica that missed the write
+        """
+        now = time.monotonic()
+        return any(
+            now - self.invalidated_at.get(tag, -math.inf) < IRIS_CACHE_REPLICA_LAG
+            for tag in tags
+        )
+
+    async def invalidate_tags(self, *tags: str, repeat: bool = True) -> None:
+        """Delete every cached value registered under one of the given tags
+
+        Args:
+            tags (str): Invalidation tags (e.g. "game:1234", "collections")
+            repeat (bool, optional): Invalidate again after IRIS_CACHE_REPLICA_LAG,
+                dropping values cached from a lagging replica in the meantime.
+                Defaults to True.
+        """
+        self.local.invalidate_tags(tags)
+        self.mark_invalidated(tags)
+
+        if repeat and IRIS_CACHE_REPLICA_LAG > 0:
+            task = asyncio.create_task(self.delayed_invalidation(tags))
+            self.delayed_invalidations.add(task)
+            task.add_done_callback(self.delayed_invalidations.discard)
+
+        try:
+            tag_keys = [self.tag_key(tag) for tag in tags]
+            keys = set()
+            for tag_key in tag_keys:
+                keys.update(await self.redis.smembers(tag_key))
+
+            await self.redis.delete(*keys, *tag_keys)
+            await self.redis.publish(self.channel, json.dumps(tags))
+            logger.info("Cache invalidated for tags %s (%s entries).", tags, len(keys))
+        except RedisError as exc:
+            logger.error("Error while invalidating cache tags %s: %s", tags, exc)
+
+    async def delayed_invalidation(self, tags: tuple[str, ...]) -> None:
+        await asyncio.sleep(IRIS_CACHE_REPLICA_LAG)
+        await self.invalidate_tags(*tags, repeat=False)
+
+    async def listen_invalidations(self) -> None:
+        """Drop the local entries invalidated by any worker, reconnecting on error"""
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            tags = json.loads(message["data"])
+                            self.local.invalidate_tags(tags)
+                            self.mark_invalidated(tags)
+            except RedisError as exc:
+                logger.warning("Cache invalidation listener disconnected: %s", exc)
+                # Entries may have been missed while disconnected
+                self.local = LocalLRUCache(self.local.max_bytes, self.local.ttl)
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """Start the cross-worker invalidation listener"""
+        self.listener = asyncio.create_task(self.listen_invalidations())
+
+    async def stop(self) -> None:
+        """Stop the cross-worker invalidation listener and the pending delayed invalidations"""
+        for task in list(self.delayed_invalidations):
+            task.cancel()
+
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+
+    def cached(
+        self,
+        name: str,
+        ttl: int,
+        tags: Callable[..., list[str]],
+        condition: Callable[..., bool] = None,
+    ):
+        """Decorator caching the result of an async IRIS wrapper method
+
+        Args:
+            name (str): Cached endpoint name
+            ttl (int): Time to live in seconds
+            tags (Callable[..., list[str]]): Build the invalidation tags from the
+                method arguments
+            condition (Callable[..., bool], optional): Only cache the calls for
+                which it returns True. Defaults to None (always cache).
+        """
+
+        def decorator(method):
+            @wraps(method)
+            async def wrapper(wrapper_self, *args, **kwargs):
+                # A writer holding a primary connection must read its own writes
+                if connectors.iris_aconn.get() is not None or (
+                    condition is not None and not condition(*args, **kwargs)
+                ):
+                    return await method(wrapper_self, *args, **kwargs)
+
+                key = self.make_key(name, *args, **kwargs)
+                value_tags = tags(*args, **kwargs)
+                value = await self.get(name, key, ttl, value_tags)
+                if value is not None:
+                    return value
+
+                value = await method(wrapper_self, *args, **kwargs)
+                if value is not None and not self.recently_invalidated(value_tags):
+                    await self.set(name, key, value, ttl, value_tags)
+                return value
+
+            return wrapper
+
+        return decorator
+
+    def get_stats(self) -> dict:
+        """Get the hit / miss / error counters of every cached endpoint and the
+            local tier usage
+
+        Returns:
+            dict: Cache counters by endpoint name and local tier usage
+        """
+        return {"endpoints": dict(self.stats), "local": self.local.get_stats()}
+
+
+iris_cache = IrisCache(REDIS_ASYNC)
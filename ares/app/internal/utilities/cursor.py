@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+import math
+from datetime import date
+from typing import Literal
+
+from app.internal.errors.global_exceptions import InvalidBody
+
+
+def encode_cursor(signature: str, key: list) -> str:
+    """Encode an opaque pagination cursor
+
+    Args:
+        signature (str): Identifies the listing the cursor belongs to (e.g. "games:rating:desc")
+        key (list): Sort key and ID of the last returned row
+
+    Returns:
+        str: URL safe cursor token
+    """
+    payload = json.dumps({"s": signature, "k": key}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_sort_key(value, key_type: Literal["number", "date"]):
+    """Check the sort key of a decoded cursor against the type of the listing key
+
+    Args:
+        value (Any): Sort key as decoded from JSON
+        key_type (str): "number" (finite int or float) or "date" (ISO date or None)
+
+    Raises:
+        ValueError: The sort key does not have the expected type
+
+    Returns:
+        Any: Sort key, dates are parsed
+    """
+    if key_type == "date":
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+    elif (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+    ):
+        return value
+
+    raise ValueError(f"Invalid {key_type} sort key")
+
+
+def decode_cursor(
+    cursor: str, signature: str, key_type: Literal["number", "date"] = "number"
+) -> list:
+    """Decode an opaque pagination cursor. Cursors are not signed, so the key
+        types are checked before they reach the database.
+
+    Args:
+        cursor (str): Cursor token returned by a previous page
+        signature (str): Expected listing signature
+        key_type (str, optional): Type of the listing sort key, "number" or "date".
+            Defaults to "number".
+
+    Raises:
+        InvalidBody: The cursor is malformed or belongs to another listing
+
+    Returns:
+        list: Sort key and ID of the last row of the previous page
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = payload["k"]
+        valid = (
+            payload["s"] == signature
+            and isinstance(key, list)
+            and len(key) == 2
+            and type(key[1]) is int
+        )
+        if valid:
+            key = [decode_sort_key(key[0], key_type), key[1]]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        valid = False
+
+    if not valid:
+        raise InvalidBody("Invalid pagination cursor")
+
+    return key
+
+
+def paginate(
+    rows: list[dict], limit: int, signature: str | None, id_field: str = "id"
+) -> tuple[list[dict], str | None]:
+    """Strip the cursor_key column from a page of rows and build the cursor of
+        the next page
+
+    Args:
+        rows (list[dict]): Rows selected with a cursor_key column
+        limit (int): Page size
+        signature (str | None): Listing signature, None if the listing can't be paginated by cursor
+        id_field (str, optional): Unique tie-breaker column. Defaults to "id".
+
+    Returns:
+        tuple[list[dict], str | None]: Rows and next page cursor (None on last page)
+    """
+    cursor_keys = [row.pop("cursor_key") for row in rows]
+
+    if signature is None or len(rows) < limit or not rows:
+        return rows, None
+
+    return rows, encode_cursor(signature, [cursor_keys[-1], rows[-1][id_field]])
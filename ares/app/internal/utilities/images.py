@@ -0,0 +1,183 @@
+import asyncio
+import io
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import blurhash
+import numpy as np
+from PIL import Image, ImageOps
+
+# Image decoding / resizing is CPU bound, it runs in worker processes to escape the GIL
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+JPEG_QUALITY = 85
+
+# Blurhash only keeps a few low frequency components, it is computed on a thumbnail
+BLURHASH_COMPONENTS = (4, 3)
+BLURHASH_THUMBNAIL_SIZE = 32
+# "numpy" (vectorized) or "blurhash" (blurhash-python library)
+BLURHASH_ENCODER = os.getenv("BLURHASH_ENCODER", "numpy")
+BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+image_pool: ProcessPoolExecutor | None = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Get the image processing pool, started on first use"""
+    global image_pool
+    if image_pool is None:
+        image_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+    return image_pool
+
+
+def shutdown_image_pool() -> None:
+    """Stop the image processing worker processes"""
+    global image_pool
+    if image_pool is not None:
+        image_pool.shutdown(wait=True, cancel_futures=True)
+        image_pool = None
+
+
+async def run_in_image_pool(sync_function, *args, **kwargs):
+    """Run a picklable synchronous function in the image processing pool
+
+    Args:
+        sync_function (function): Module level function to run
+
+    Returns:
+        Any: Result of the function
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_image_pool(), partial(sync_function, *args, **kwargs)
+    )
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Write a file through a temporary file renamed over the destination, so
+        readers never see a partially written file
+
+    Args:
+        path (str): Destination path
+        data (bytes): File content
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def encode_base83(value: int, length: int) -> str:
+    return "".join(
+        BASE83_CHARS[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1)
+    )
+
+
+def linear_to_srgb(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode_blurhash_numpy(img: Image.Image, x_components: int, y_components: int) -> str:
+    """Blurhash encoder computing every DCT component at once with numpy
+
+    Args:
+        img (Image.Image): RGB image
+        x_components (int): Number of horizontal components
+        y_components (int): Number of vertical components
+
+    Returns:
+        str: Blurhash
+    """
+    pixels = np.asarray(img, dtype=np.float64) / 255
+    linear = np.where(pixels <= 0.04045, pixels / 12.92, ((pixels + 0.055) / 1.055) ** 2.4)
+    height, width = linear.shape[:2]
+
+    cos_x = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    cos_y = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    # factors[j, i] = mean over the pixels of cos_y[j] * cos_x[i] * pixel
+    factors = np.einsum("jy,ix,yxc->jic", cos_y, cos_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+
+    dc, ac = factors[0], factors[1:]
+
+    blur_hash = encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+
+    if len(ac):
+        quantised_max = int(max(0, min(82, math.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum_value = 0, 1
+    blur_hash += encode_base83(quantised_max, 1)
+
+    r, g, b = (linear_to_srgb(value) for value in dc)
+    blur_hash += encode_base83((r << 16) + (g << 8) + b, 4)
+
+    quantised = np.floor(
+        np.sign(ac) * np.sqrt(np.abs(ac / maximum_value)) * 9 + 9.5
+    ).clip(0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        blur_hash += encode_base83(qr * 19 * 19 + qg * 19 + qb, 2)
+
+    return blur_hash
+
+
+def compute_blurhash(img: Image.Image) -> str:
+    """Compute the blurhash of an image on a thumbnail of it
+
+    Args:
+        img (Image.Image): RGB image
+
+    Returns:
+        str: Blurhash
+    """
+    thumbnail = img.copy()
+    thumbnail.thumbnail((BLURHASH_THUMBNAIL_SIZE, BLURHASH_THUMBNAIL_SIZE), Image.BILINEAR)
+
+    if BLURHASH_ENCODER == "numpy":
+        return encode_blurhash_numpy(thumbnail, *BLURHASH_COMPONENTS)
+
+    x_components, y_components = BLURHASH_COMPONENTS
+    return blurhash.encode(thumbnail, x_components=x_components, y_components=y_components)
+
+
+def derive_images(source: bytes, source_path: str, variants: list[tuple]) -> str:
+    """Write an image and its smaller variants, decoding it only once, and
+        compute its blurhash. Runs in the image processing pool.
+
+    Args:
+        source (bytes): Original JPEG image
+        source_path (str): Path of the original image
+        variants (list[tuple]): (path, (width, height), mode) of each variant, mode
+            being "lfill" (scaled and center cropped to the exact size) or "fit"
+            (scaled to fit in the size, keeping the aspect ratio)
+
+    Returns:
+        str: Blurhash
+    """
+    atomic_write(source_path, source)
+
+    with Image.open(io.BytesIO(source)) as img:
+        img = img.convert("RGB")
+
+        for path, size, mode in variants:
+            if mode == "lfill":
+                variant = ImageOps.fit(img, size, Image.LANCZOS)
+            else:
+                variant = ImageOps.contain(img, size, Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            variant.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            atomic_write(path, buffer.getvalue())
+
+        return compute_blurhash(img)
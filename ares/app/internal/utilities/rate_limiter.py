@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket: allows bursts of up to `capacity` calls, then
+    `rate` calls per second. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+
+        self.rate = rate
+        # A bucket must hold at least one token, otherwise acquire never returns
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it"""
+        async with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
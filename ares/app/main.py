@@ -9,6 +9,7 @@ from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from psycopg_pool import PoolTimeout
 
 from app.internal.errors.igdb_exceptions import (
     IGDBInvalidReponseCode,
@@ -26,9 +27,17 @@ from app.internal.errors.iris_exceptions import (
 )
 from app.internal.errors.youtube_exceptions import YoutubeException
 
-from app.internal.IRIS.iris_db_connection import IrisAsyncConnection
+from app.internal.IGDB.igdb_request import igdb_request
+from app.internal.IRIS.iris_db_connection import (
+    IrisAsyncConnectionPool,
+    IrisReadOnlyConnectionPool,
+)
 from app.internal.IRIS.data_access_layer.iris_dal_main import IrisDataAccessLayer
+from app.internal.IRIS.data_access_layer.iris_statements import iris_statements
 from app.internal.IRIS.iris_queries_wrapper import Iris
+from app.internal.utilities.cache import iris_cache
+from app.internal.utilities.images import shutdown_image_pool
+from app.internal.utilities.auth import require_valid_token
 
 from app.routers import games_routes
 from app.routers import youtube_routes
@@ -50,10 +59,15 @@ limiter = Limiter(key_func=get_remote_address)
 async def get_iris_conn(app: FastAPI):  # pylint: disable=unused-argument
     """Initialize FastAPI objects before starting the app"""
 
-    # Init IRIS connection
-    conn = IrisAsyncConnection()
-    await conn.connect_to_iris()
-    await connectors.init_global_aconn(conn)
+    # Init IRIS connection pool
+    pool = IrisAsyncConnectionPool()
+    await pool.connect_to_iris()
+    await connectors.init_global_pool(pool)
+
+    # Init IRIS read-only connection pool for public catalog reads
+    read_pool = IrisReadOnlyConnectionPool()
+    await read_pool.connect_to_iris()
+    await connectors.init_global_read_pool(read_pool)
 
     # Init IRIS Data Access Layer
     await connectors.init_global_iris_dal(IrisDataAccessLayer())
@@ -61,10 +75,21 @@ async def get_iris_conn(app: FastAPI):  # pylint: disable=unused-argument
     # Init IRIS API wrapper
     await connectors.init_global_iris_query_wrapper(Iris())
 
+    # Keep this worker's local cache tier coherent with the other workers
+    iris_cache.start()
+
+    # Open the keep-alive IGDB API and images clients
+    igdb_request.open_clients()
+
     yield  # All the code after this line is executed after the app is closed
 
-    # Close IRIS connection
-    await conn.close()
+    await igdb_request.close_clients()
+    await iris_cache.stop()
+    shutdown_image_pool()
+
+    # Close IRIS connection pools
+    await read_pool.close()
+    await pool.close()
 
 
 ares = FastAPI(lifespan=get_iris_conn)
@@ -136,6 +161,14 @@ async def SQLError_handler(request: Request, exc: SQLError):
     return JSONResponse(status_code=500, content={"detail": exc.message})
 
 
+@ares.exception_handler(PoolTimeout)
+async def PoolTimeout_handler(request: Request, exc: PoolTimeout):
+    logger.error("No IRIS connection available: %s", exc)
+    return JSONResponse(
+        status_code=503, content={"detail": "Database connection pool exhausted"}
+    )
+
+
 @ares.exception_handler(DatabaseCommitError)
 async def DatabaseCommitError_handler(request: Request, exc: DatabaseCommitError):
     logger.error(exc.message)
@@ -179,7 +212,7 @@ ares.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Process-Time"],
+    expose_headers=["X-Process-Time", "X-Next-Cursor", "X-Random-Seed"],
 )
 
 
@@ -199,6 +232,37 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@ares.get("/health/iris-pool")
+@require_valid_token
+async def iris_pool_metrics(request: Request):
+    """IRIS connection pool metrics (size, available, waiting, usage counters)"""
+    return {
+        "primary": connectors.iris_pool.get_stats(),
+        "read": connectors.iris_read_pool.get_stats(),
+    }
+
+
+@ares.get("/health/iris-statements")
+@require_valid_token
+async def iris_statements_metrics(request: Request):
+    """IRIS prepared statements execution time counters by statement"""
+    return iris_statements.get_stats()
+
+
+@ares.get("/health/cache")
+@require_valid_token
+async def iris_cache_metrics(request: Request):
+    """IRIS response cache hit / miss / error counters by endpoint"""
+    return iris_cache.get_stats()
+
+
+@ares.get("/health/igdb-cache")
+@require_valid_token
+async def igdb_cache_metrics(request: Request):
+    """IGDB responses cache hit / miss / error counters by endpoint"""
+    return igdb_request.cache.get_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,12 +1,16 @@
 import asyncio
+import os
+import random
 import traceback
 from fastapi import Request, APIRouter
+from psycopg.errors import DeadlockDetected, SerializationFailure
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.encoders import jsonable_encoder
 from slowapi.util import get_remote_address
 from slowapi import Limiter
 
-from app.internal.IGDB.igdb_api_wrapper import igdb_client
+from app.internal.IGDB.igdb_api_wrapper import igdb_client, IGDB_MAX_LIMIT
+from app.internal.IRIS.iris_db_connection import IRIS_POOL_MAX_SIZE
 from app.internal.Global.wizard import Wizard, multiple_wizard
 
 import app.connectors as connectors
@@ -22,40 +26,196 @@ from app.internal.utilities.auth import require_valid_token
 from app.utils.loggers import base_logger as logger
 from app.internal.utilities.task import task_manager, Task
 
+# Bulk creation workers, each holds a primary pool connection while pushing a game
+BULK_CREATE_CONCURRENCY = int(os.getenv("BULK_CREATE_CONCURRENCY", "4"))
+BULK_CREATE_MAX_CONCURRENCY = max(1, IRIS_POOL_MAX_SIZE // 2)
+# Pushes of games referencing each other deadlock, the aborted one is retried
+BULK_CREATE_RETRIES = int(os.getenv("BULK_CREATE_RETRIES", "3"))
+
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-async def process_games(igdb_ids: list, task: Task):
-    """Function to process games in bulk and push them to database
+def is_transaction_conflict(exc: BaseException) -> bool:
+    """Check if an error was caused by a deadlock or a serialization failure,
+        the DAL wraps them in SQLError
 
     Args:
-        igdb_ids (list): List of IGDB IDs to process
-        task_id (str): Task ID to track progress
+        exc (BaseException): Error raised while pushing a game
+
+    Returns:
+        bool: True if the push can be retried
     """
+    while exc is not None:
+        if isinstance(exc, (DeadlockDetected, SerializationFailure)):
+            return True
+        exc = exc.__cause__
+    return False
 
-    total_games = len(igdb_ids)
-    logger.info("Starting bulk game creation. Total games: %s", total_games)
 
-    for index, igdb_id in enumerate(igdb_ids):
-        try:
-            game_existence = await connectors.iris_dal.check_game_existence(igdb_id)
+async def process_game(
+    igdb_id: int, game_existence: int, game_data: dict, task: Task
+) -> None:
+    """Push a game fetched from IGDB to database
+
+    Args:
+        igdb_id (int): IGDB ID of the game
+        game_existence (int): Game existence status when its batch was fetched
+        game_data (dict): IGDB game data
+        task (Task): Bulk creation task, errors are reported on it
+    """
+    try:
+        for attempt in range(BULK_CREATE_RETRIES):
+            # Games pushed since the batch was fetched may have added or completed this one
+            if game_existence != 2:
+                game_existence = await connectors.iris_dal.check_game_existence(igdb_id)
             if game_existence == 2:
                 logger.info("Game [%s] already exists in database. Skipping.", igdb_id)
-                continue
-            game_data = await igdb_client.get_game_data, igdb_id
-            await connectors.iris_query_wrapper.push_new_game(game_data, game_existence)
-        except Exception as e:
-            logger.error("Error while processing game [%s].", igdb_id)
-            logger.error(traceback.format_exc())
+                return
+
+            try:
+                # push_new_game checks out its connection once the media and companies are fetched
+                await connectors.iris_query_wrapper.push_new_game([game_data], game_existence)
+                return
+            except Exception as e:
+                if attempt == BULK_CREATE_RETRIES - 1 or not is_transaction_conflict(e):
+                    raise
+
+                logger.warning(
+                    "Transaction conflict while pushing game [%s], retrying (%s/%s).",
+                    igdb_id,
+                    attempt + 1,
+                    BULK_CREATE_RETRIES - 1,
+                )
+                await asyncio.sleep(random.uniform(0.1, 0.5) * (attempt + 1))
+    except Exception as e:
+        logger.error("Error while processing game [%s].", igdb_id)
+        logger.error(traceback.format_exc())
+
+        task.add_error(e, igdb_id)
 
-            task.add_error(e, igdb_id)
 
-        task.update_task_progress((index + 1) / total_games * 100)
+async def process_games(
+    igdb_ids: list[int], task: Task, concurrency: int = BULK_CREATE_CONCURRENCY
+):
+    """Function to process games in bulk and push them to database.
+        Games missing from the database are fetched from IGDB by batches of
+        IGDB_MAX_LIMIT, then pushed by a bounded pool of workers.
+
+    Args:
+        igdb_ids (list[int]): List of IGDB IDs to process (see parse_igdb_ids)
+        task (Task): Task to track progress
+        concurrency (int, optional): Number of workers. Defaults to BULK_CREATE_CONCURRENCY.
+    """
+
+    total_games = len(igdb_ids)
+    logger.info(
+        "Starting bulk game creation. Total games: %s, workers: %s",
+        total_games,
+        concurrency,
+    )
+
+    # Bounded so that fetching the next batch waits for the workers
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    processed_games = 0
+
+    def game_processed():
+        nonlocal processed_games
+        processed_games += 1
+        task.update_task_progress(processed_games / total_games * 100)
+
+    async def fetch_games():
+        for start in range(0, total_games, IGDB_MAX_LIMIT):
+            chunk = igdb_ids[start : start + IGDB_MAX_LIMIT]
+            try:
+                games_existence = await connectors.iris_dal.check_games_existence(chunk)
+                games_data = await igdb_client.get_games_data(
+                    [igdb_id for igdb_id in chunk if games_existence[igdb_id] != 2]
+                )
+            except Exception as e:
+                logger.error("Error while fetching games %s to %s.", chunk[0], chunk[-1])
+                logger.error(traceback.format_exc())
+                for igdb_id in chunk:
+                    task.add_error(e, igdb_id)
+                    game_processed()
+                continue
+
+            games_data = {game_data["id"]: game_data for game_data in games_data}
+            for igdb_id in chunk:
+                if games_existence[igdb_id] == 2:
+                    logger.info("Game [%s] already exists in database. Skipping.", igdb_id)
+                    game_processed()
+                elif igdb_id not in games_data:
+                    task.add_error(ObjectNotFound("Game with IGDB ID " + str(igdb_id)), igdb_id)
+                    game_processed()
+                else:
+                    await queue.put((igdb_id, games_existence[igdb_id], games_data[igdb_id]))
+
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while (game := await queue.get()) is not None:
+            await process_game(*game, task)
+            game_processed()
+
+    await asyncio.gather(fetch_games(), *(worker() for _ in range(concurrency)))
     task.complete_task()
 
 
+def parse_igdb_ids(values) -> list[int]:
+    """Validate IGDB IDs from a request body before scheduling a bulk task
+
+    Args:
+        values (Any): IDs as received (ints or numeric strings)
+
+    Raises:
+        InvalidBody: The IDs are not a list of positive integers
+
+    Returns:
+        list[int]: IGDB IDs, without duplicates, in their first order
+    """
+    if not isinstance(values, list):
+        raise InvalidBody("igdb_ids must be a list of IGDB IDs")
+
+    try:
+        igdb_ids = [int(value) for value in values]
+    except (TypeError, ValueError):
+        igdb_ids = []
+
+    if len(igdb_ids) != len(values) or any(igdb_id <= 0 for igdb_id in igdb_ids):
+        raise InvalidBody("igdb_ids must be a list of positive integers")
+
+    # A repeated ID would be pushed by two workers at once
+    return list(dict.fromkeys(igdb_ids))
+
+
+def get_bulk_concurrency(body: dict) -> int:
+    """Get the number of bulk creation workers requested in a body
+
+    Args:
+        body (dict): Request body, with an optional "concurrency" field
+
+    Raises:
+        InvalidBody: The concurrency is not between 1 and BULK_CREATE_MAX_CONCURRENCY
+
+    Returns:
+        int: Number of workers
+    """
+    try:
+        concurrency = int(body.get("concurrency", BULK_CREATE_CONCURRENCY))
+    except (TypeError, ValueError):
+        concurrency = 0
+
+    if not 1 <= concurrency <= BULK_CREATE_MAX_CONCURRENCY:
+        raise InvalidBody(
+            f"concurrency must be between 1 and {BULK_CREATE_MAX_CONCURRENCY}"
+        )
+
+    return concurrency
+
+
 # ------------------ ROUTEURS ---------------------- #
 
 
@@ -76,6 +236,9 @@ async def add_new_game_bulk_list(request: Request) -> dict:
     if igdb_ids is None:
         raise InvalidBody()
 
+    igdb_ids = parse_igdb_ids(igdb_ids)
+    concurrency = get_bulk_concurrency(body)
+
     task = task_manager.create_task(
         "bulk-game-creation",
         "percent",
@@ -83,7 +246,7 @@ async def add_new_game_bulk_list(request: Request) -> dict:
     )
 
     try:
-        asyncio.create_task(process_games(igdb_ids, task))
+        asyncio.create_task(process_games(igdb_ids, task, concurrency))
     except Exception as e:
         raise GenericError(e)
 
@@ -101,10 +264,13 @@ async def add_new_game_bulk_range(request: Request) -> dict:
     if igdb_ids_from is None or igdb_ids_to is None:
         raise InvalidBody()
 
-    igdb_ids_from = int(igdb_ids_from)
-    igdb_ids_to = int(igdb_ids_to)
+    [igdb_ids_from] = parse_igdb_ids([igdb_ids_from])
+    [igdb_ids_to] = parse_igdb_ids([igdb_ids_to])
+    if igdb_ids_from > igdb_ids_to:
+        raise InvalidBody("igdb_ids_from must not be greater than igdb_ids_to")
 
     igdb_ids = list(range(igdb_ids_from, igdb_ids_to + 1))
+    concurrency = get_bulk_concurrency(body)
 
     task = task_manager.create_task(
         "bulk-game-creation",
@@ -113,7 +279,7 @@ async def add_new_game_bulk_range(request: Request) -> dict:
     )
 
     try:
-        asyncio.create_task(process_games(igdb_ids, task))
+        asyncio.create_task(process_games(igdb_ids, task, concurrency))
     except Exception as e:
         raise GenericError(e)
 
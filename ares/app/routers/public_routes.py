@@ -1,5 +1,6 @@
+import random
 from typing import Annotated, List, Optional
-from fastapi import Request, APIRouter, Query, Body
+from fastapi import Request, Response, APIRouter, Query, Body
 from fastapi.security import OAuth2PasswordBearer
 from slowapi.util import get_remote_address
 from slowapi import Limiter
@@ -13,6 +14,7 @@ from app.internal.errors.global_exceptions import (
     GenericError,
 )
 from app.internal.errors.iris_exceptions import ObjectAlreadyExistsError
+from app.internal.IRIS.data_access_layer.iris_dal_main import GAME_PAGE_SECTIONS
 
 from app.utils.loggers import base_logger as logger
 
@@ -21,6 +23,23 @@ limiter = Limiter(key_func=get_remote_address)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+def set_next_cursor(response: Response, next_cursor: str | None) -> None:
+    """Expose the cursor of the next page, if any, in the X-Next-Cursor header"""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+
+def get_random_seed(response: Response, sort_type: str, seed: int | None) -> int:
+    """Pick a seed for random sorts when the client didn't provide one and
+        expose it in the X-Random-Seed header so the next pages keep the same order"""
+    if sort_type != "random":
+        return 0
+    if seed is None:
+        seed = random.randrange(2**31)
+    response.headers["X-Random-Seed"] = str(seed)
+    return seed
+
+
 # ------------------ GAMES ---------------------- #
 
 
@@ -28,26 +47,36 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 @limiter.limit("30/minute")
 async def get_games_sorted(
     request: Request,
+    response: Response,
     sort_type: Annotated[str, Query(..., regex="^(rating|random|recent)$")],
     sort_order: Annotated[str, Query(..., regex="^(asc|desc)$")] = "desc",
     offset: Annotated[int, Query(..., ge=0)] = 0,
     limit: Annotated[int, Query(..., ge=1, le=50)] = 10,
+    cursor: Annotated[str | None, Query()] = None,
+    seed: Annotated[int | None, Query(..., ge=0)] = None,
 ):  # pylint: disable=unused-argument
     """Get games sorted by a specific type (rating, random, recent)
 
     Args:
         request (Request): FastAPI Request object
+        response (Response): FastAPI Response object
         sort_type (Annotated[str, Query, optional): Sort type (rating, random, recent)
         sort_order (Annotated[str, Query, optional): Sort order (asc, desc)
-        offset (int): offset in results (default 0)
+        offset (int): offset in results, applied after the cursor (default 0)
         limit (int): limit of results (default 10, max 50)
+        cursor (str, optional): X-Next-Cursor header of the previous page
+        seed (int, optional): Seed of the random sort, generated and returned in
+            the X-Random-Seed header if not provided
 
     Returns:
-        JSONResponse: JSON response with games data
+        JSONResponse: JSON response with games data, next page cursor in the
+            X-Next-Cursor header
     """
-    games_data = await connectors.iris_query_wrapper.get_games_sorted(
-        sort_type, sort_order, offset, limit
+    seed = get_random_seed(response, sort_type, seed)
+    games_data, next_cursor = await connectors.iris_query_wrapper.get_games_sorted(
+        sort_type, sort_order, offset, limit, cursor, seed
     )
+    set_next_cursor(response, next_cursor)
 
     return games_data
 
@@ -56,27 +85,32 @@ async def get_games_sorted(
 @limiter.limit("30/minute")
 async def get_game_top_tracks(
     request: Request,
+    response: Response,
     game_id: int,
     offset: Annotated[int, Query(..., ge=0)] = 0,
     limit: Annotated[int, Query(..., ge=1, le=50)] = 10,
+    cursor: Annotated[str | None, Query()] = None,
 ):  # pylint: disable=unused-argument
     """Get game top tracks by game ID
 
     Args:
         request (Request): FastAPI Request object
+        response (Response): FastAPI Response object
         game_id (int): Game ID
-        offset (int): offset in results (default 0)
+        offset (int): offset in results, applied after the cursor (default 0)
         limit (int): limit of results (default 10, max 50)
+        cursor (str, optional): X-Next-Cursor header of the previous page
     Raises:
         ObjectNotFound: _description_
 
     Returns:
-        List[dict]: List of top tracks
+        List[dict]: List of top tracks, next page cursor in the X-Next-Cursor header
     """
 
-    game_top_tracks = await connectors.iris_query_wrapper.get_game_top_tracks(
-        game_id, offset, limit
+    game_top_tracks, next_cursor = await connectors.iris_query_wrapper.get_game_top_tracks(
+        game_id, offset, limit, cursor
     )
+    set_next_cursor(response, next_cursor)
 
     return game_top_tracks
 
@@ -127,6 +161,42 @@ async def get_game_related_games(
 
     return game_related_games
 
+@router.get("/games/{game_id}/page", tags=["games"])
+@limiter.limit("30/minute")
+async def get_game_page(
+    request: Request,
+    game_id: int,
+    sections: Annotated[List[str], Query()] = list(GAME_PAGE_SECTIONS),
+    top_tracks_limit: Annotated[int, Query(..., ge=1, le=50)] = 10,
+    related_games_limit: Annotated[int, Query(..., ge=1, le=50)] = 10,
+):  # pylint: disable=unused-argument
+    """Get a game and the sections of its page (categories, top tracks, albums,
+        related games) in a single request
+
+    Args:
+        request (Request): FastAPI Request object
+        game_id (int): IGDB ID of the game
+        sections (List[str]): Sections to include (default all)
+        top_tracks_limit (int): limit of top tracks (default 10, max 50)
+        related_games_limit (int): limit of related games (default 10, max 50)
+
+    Returns:
+        JSONResponse: JSON response with game page data
+    """
+    if not set(sections) <= GAME_PAGE_SECTIONS.keys():
+        raise InvalidBody(
+            "sections must be among " + ", ".join(GAME_PAGE_SECTIONS)
+        )
+
+    game_page = await connectors.iris_query_wrapper.get_game_page(
+        game_id, sorted(set(sections)), top_tracks_limit, related_games_limit
+    )
+
+    if not game_page:
+        raise ObjectNotFound("Game not found.")
+
+    return game_page
+
 @router.get("/games/{game_id}", tags=["games"])
 @limiter.limit("30/minute")
 async def get_game_by_id(
@@ -154,24 +224,29 @@ async def get_game_by_id(
 @limiter.limit("30/minute")
 async def get_collection_top_tracks(
     request: Request,
+    response: Response,
     collection_id: int,
     offset: Annotated[int, Query(..., ge=0)] = 0,
     limit: Annotated[int, Query(..., ge=1, le=50)] = 10,
+    cursor: Annotated[str | None, Query()] = None,
 ): # pylint: disable=unused-argument
     """Get collection top tracks by collection ID
 
     Args:
         request (Request): FastAPI Request object
+        response (Response): FastAPI Response object
         collection_id (int): Collection ID
-        offset (int): offset in results (default 0)
+        offset (int): offset in results, applied after the cursor (default 0)
         limit (int): limit of results (default 10, max 50)
+        cursor (str, optional): X-Next-Cursor header of the previous page
 
     Returns:
-        List[dict]: List of top tracks
+        List[dict]: List of top tracks, next page cursor in the X-Next-Cursor header
     """
-    collection_top_tracks = await connectors.iris_query_wrapper.get_collection_top_tracks(
-        collection_id, offset, limit
+    collection_top_tracks, next_cursor = await connectors.iris_query_wrapper.get_collection_top_tracks(
+        collection_id, offset, limit, cursor
     )
+    set_next_cursor(response, next_cursor)
 
     return collection_top_tracks
 
@@ -179,27 +254,37 @@ async def get_collection_top_tracks(
 @limiter.limit("30/minute")
 async def get_collections_sorted(
     request: Request,
+    response: Response,
     sort_type: Annotated[str, Query(..., regex="^(rating|random|recent)$")],
     sort_order: Annotated[str, Query(..., regex="^(asc|desc)$")] = "desc",
     min_games: Annotated[int, Query(..., ge=1)] = 1,
     offset: Annotated[int, Query(..., ge=0)] = 0,
     limit: Annotated[int, Query(..., ge=1, le=50)] = 10,
+    cursor: Annotated[str | None, Query()] = None,
+    seed: Annotated[int | None, Query(..., ge=0)] = None,
 ):  # pylint: disable=unused-argument
     """Get collections sorted by a specific type (rating, random, recent)
 
     Args:
         request (Request): FastAPI Request object
+        response (Response): FastAPI Response object
         sort_type (Annotated[str, Query, optional): Sort type (rating, random, recent)
         sort_order (Annotated[str, Query, optional): Sort order (asc, desc)
-        offset (int): offset in results (default 0)
+        offset (int): offset in results, applied after the cursor (default 0)
         limit (int): limit of results (default 10, max 50)
+        cursor (str, optional): X-Next-Cursor header of the previous page
+        seed (int, optional): Seed of the random sort, generated and returned in
+            the X-Random-Seed header if not provided
 
     Returns:
-        JSONResponse: JSON response with collections data
+        JSONResponse: JSON response with collections data, next page cursor in
+            the X-Next-Cursor header
     """
-    collections_data = await connectors.iris_query_wrapper.get_collections_sorted(
-        sort_type, sort_order, min_games, offset, limit
+    seed = get_random_seed(response, sort_type, seed)
+    collections_data, next_cursor = await connectors.iris_query_wrapper.get_collections_sorted(
+        sort_type, sort_order, min_games, offset, limit, cursor, seed
     )
+    set_next_cursor(response, next_cursor)
 
     return collections_data
 
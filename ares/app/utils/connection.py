@@ -1,5 +1,6 @@
 import os
 import redis
+import redis.asyncio
 
 from dotenv import load_dotenv
 
@@ -11,4 +12,7 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 
 REDIS_GLOBAL = redis.Redis(
     host=REDIS_HOST, port="6379", password=REDIS_PASSWORD, db=0
-)
\ No newline at end of file
+)
+REDIS_ASYNC = redis.asyncio.Redis(
+    host=REDIS_HOST, port="6379", password=REDIS_PASSWORD, db=0
+)
@@ -0,0 +1,57 @@
+/*
+    Brings a database created before the keyset pagination, the seeded random
+    sort and the collection statistics view up to date. The init scripts (01-iris-schema.sql) only run on an empty
+    data directory, existing deployments must run this migration once :
+        bash docker/scripts/migrate_db.sh <container_name>
+    Every statement is idempotent, running it again is a no-op.
+*/
+
+BEGIN;
+
+-- --------------------Seeded random sort-------------------- --
+
+-- random() is volatile, so Postgres evaluates it for every existing row when adding the column
+ALTER TABLE iris.game ADD COLUMN IF NOT EXISTS "random_key" double precision NOT NULL DEFAULT random();
+ALTER TABLE iris.collection ADD COLUMN IF NOT EXISTS "random_key" double precision NOT NULL DEFAULT random();
+
+
+-- --------------------Keyset pagination indexes-------------------- --
+
+CREATE INDEX IF NOT EXISTS idx_game_complete_rating_id ON iris.game ((coalesce(rating, -1)), id) WHERE complete;
+CREATE INDEX IF NOT EXISTS idx_game_complete_release_date_id ON iris.game ((coalesce(first_release_date, '0001-01-01'::date)), id) WHERE complete;
+CREATE INDEX IF NOT EXISTS idx_track_game_id_play_count_id ON iris.track (game_id, play_count, id);
+CREATE INDEX IF NOT EXISTS idx_game_collection_id ON iris.game (collection_id);
+CREATE INDEX IF NOT EXISTS idx_game_complete_random_key_id ON iris.game (random_key, id) WHERE complete;
+
+
+
+-- --------------------Collection statistics-------------------- --
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS iris.collection_stats AS
+    SELECT
+        c.id AS collection_id,
+        c.random_key,
+        count(DISTINCT(g.id)) AS n_games,
+        avg(DISTINCT(g.rating)) AS avg_rating,
+        max(g.first_release_date) AS latest_game_release_date,
+        count(at2.track_id) AS n_tracks
+    FROM iris.collection c
+    LEFT JOIN iris.game g ON g.collection_id = c.id
+    LEFT JOIN iris.album a ON a.game_id = g.id AND a.is_main AND a.is_visible
+    LEFT JOIN iris.album_track at2 ON at2.album_id = a.id
+    GROUP BY c.id;
+
+-- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_collection_stats_collection_id ON iris.collection_stats (collection_id);
+CREATE INDEX IF NOT EXISTS idx_collection_stats_rating_id ON iris.collection_stats ((coalesce(avg_rating, -1)), collection_id);
+CREATE INDEX IF NOT EXISTS idx_collection_stats_release_date_id ON iris.collection_stats ((coalesce(latest_game_release_date, '0001-01-01'::date)), collection_id);
+CREATE INDEX IF NOT EXISTS idx_collection_stats_random_key_id ON iris.collection_stats (random_key, collection_id);
+
+-- Brings a view left over from a previous run up to date
+REFRESH MATERIALIZED VIEW iris.collection_stats;
+
+ANALYZE iris.game;
+ANALYZE iris.collection;
+ANALYZE iris.collection_stats;
+
+COMMIT;
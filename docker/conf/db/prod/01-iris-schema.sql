@@ -8,6 +8,7 @@ CREATE TABLE iris.collection (
     "id" SERIAL,
     "name" text NOT NULL,
     "slug" text NOT NULL,
+    "random_key" double precision NOT NULL DEFAULT random(),
 
     PRIMARY KEY ("id")
 );
@@ -33,6 +34,7 @@ CREATE TABLE iris.game (
     "rating" double precision,
     "popularity" int,
     "summary" text,
+    "random_key" double precision NOT NULL DEFAULT random(),
 
     PRIMARY KEY ("id"),
     FOREIGN KEY ("parent_game") REFERENCES iris.game ("id"),
@@ -774,3 +776,42 @@ BEGIN
 END; $$ 
 LANGUAGE plpgsql;
 
+
+-- --------------------Keyset pagination indexes-------------------- --
+
+/*
+    Composite (sort key, id) indexes matching the ORDER BY of the sorted listings,
+    so that resuming a page from a cursor is an index range scan
+*/
+CREATE INDEX idx_game_complete_rating_id ON iris.game ((coalesce(rating, -1)), id) WHERE complete;
+CREATE INDEX idx_game_complete_release_date_id ON iris.game ((coalesce(first_release_date, '0001-01-01'::date)), id) WHERE complete;
+CREATE INDEX idx_track_game_id_play_count_id ON iris.track (game_id, play_count, id);
+CREATE INDEX idx_game_collection_id ON iris.game (collection_id);
+CREATE INDEX idx_game_complete_random_key_id ON iris.game (random_key, id) WHERE complete;
+
+
+-- --------------------Collection statistics-------------------- --
+
+/*
+    Per collection aggregates used by the collection listings, refreshed with
+    REFRESH MATERIALIZED VIEW CONCURRENTLY after writes (see Iris.refresh_collection_stats)
+*/
+CREATE MATERIALIZED VIEW iris.collection_stats AS
+    SELECT
+        c.id AS collection_id,
+        c.random_key,
+        count(DISTINCT(g.id)) AS n_games,
+        avg(DISTINCT(g.rating)) AS avg_rating,
+        max(g.first_release_date) AS latest_game_release_date,
+        count(at2.track_id) AS n_tracks
+    FROM iris.collection c
+    LEFT JOIN iris.game g ON g.collection_id = c.id
+    LEFT JOIN iris.album a ON a.game_id = g.id AND a.is_main AND a.is_visible
+    LEFT JOIN iris.album_track at2 ON at2.album_id = a.id
+    GROUP BY c.id;
+
+-- Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_collection_stats_collection_id ON iris.collection_stats (collection_id);
+CREATE INDEX idx_collection_stats_rating_id ON iris.collection_stats ((coalesce(avg_rating, -1)), collection_id);
+CREATE INDEX idx_collection_stats_release_date_id ON iris.collection_stats ((coalesce(latest_game_release_date, '0001-01-01'::date)), collection_id);
+CREATE INDEX idx_collection_stats_random_key_id ON iris.collection_stats (random_key, collection_id);
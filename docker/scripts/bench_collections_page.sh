@@ -0,0 +1,77 @@
+#!/bin/bash
+
+# Compare the round-trips and latency of a collection listing page with one games query
+# per collection (baseline) and with a single batched games query (stitched)
+# Usage : bash bench_collections_page.sh <ares_container_name> [n_runs]
+
+container_name=$1
+n_runs=${2:-50}
+
+# Vérifie si le nom du conteneur a été fourni
+if [ -z "$container_name" ]
+then
+    echo "Le nom du conteneur doit être fourni."
+    exit 1
+fi
+
+# Lecture seule, sur les collections existantes de la base
+docker exec -i -w /ares $container_name python - $n_runs <<'PYTHON'
+import asyncio
+import statistics
+import sys
+import time
+
+import app.connectors as connectors
+from app.internal.IRIS.iris_db_connection import IrisAsyncConnectionPool
+from app.internal.IRIS.data_access_layer.iris_dal_main import IrisDataAccessLayer
+
+N_RUNS = int(sys.argv[1])
+PAGE_SIZES = (10, 20, 50)
+SORT_TYPE = "coalesce(cs.avg_rating, -1)"
+
+
+async def load_page(limit: int, stitched: bool) -> tuple[float, int]:
+    """Load a page of collections with their games, as Iris.get_collections_sorted does"""
+    dal = connectors.iris_dal
+    async with connectors.iris_read_connection():
+        start = time.perf_counter()
+        collections = await dal.get_collections_sorted(SORT_TYPE, "desc", 1, None, 0, limit)
+        if stitched:
+            collections_games = await dal.get_collections_reduce_game_info(
+                [collection["id"] for collection in collections]
+            )
+            for collection in collections:
+                collection["games"] = collections_games[collection["id"]]
+            round_trips = 2
+        else:
+            for collection in collections:
+                collection["games"] = await dal.get_collection_reduce_game_info(collection["id"])
+            round_trips = 1 + len(collections)
+
+        return (time.perf_counter() - start) * 1000, round_trips
+
+
+async def main():
+    pool = IrisAsyncConnectionPool(min_size=1, max_size=1)
+    await pool.connect_to_iris()
+    await connectors.init_global_pool(pool)
+    await connectors.init_global_read_pool(pool)
+    await connectors.init_global_iris_dal(IrisDataAccessLayer())
+
+    for limit in PAGE_SIZES:
+        for stitched in (False, True):
+            await load_page(limit, stitched)
+            results = [await load_page(limit, stitched) for _ in range(N_RUNS)]
+            latencies = sorted(latency for latency, _ in results)
+            print(
+                f"page {limit:>2} {'stitched' if stitched else 'baseline':>8} : "
+                f"median {statistics.median(latencies):.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, "
+                f"{results[0][1]} round-trips"
+            )
+
+    await pool.close()
+
+
+asyncio.run(main())
+PYTHON
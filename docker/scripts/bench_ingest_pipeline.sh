@@ -0,0 +1,87 @@
+#!/bin/bash
+
+# Compare the per-game ingest latency of the serial and pipelined modes of push_new_game
+# Usage : bash bench_ingest_pipeline.sh <ares_container_name> [n_runs]
+
+container_name=$1
+n_runs=${2:-50}
+
+# Vérifie si le nom du conteneur a été fourni
+if [ -z "$container_name" ]
+then
+    echo "Le nom du conteneur doit être fourni."
+    exit 1
+fi
+
+# Chaque ingestion est faite dans une transaction annulée, la base n'est pas modifiée
+docker exec -i -w /ares $container_name python - $n_runs <<'PYTHON'
+import asyncio
+import os
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+
+import app.connectors as connectors
+from app.internal.IRIS.iris_db_connection import IrisAsyncConnectionPool
+from app.internal.IRIS.data_access_layer.iris_dal_main import IrisDataAccessLayer
+
+N_RUNS = int(sys.argv[1])
+GAME_ID = 900000000
+
+
+async def ingest(pipeline: bool) -> tuple[float, int]:
+    """Ingest a keyword heavy game without IGDB calls nor media downloads"""
+    async with connectors.iris_connection() as aconn:
+        start = time.perf_counter()
+        async with aconn.pipeline() if pipeline else nullcontext(), aconn.transaction(
+            force_rollback=True
+        ):
+            dal = connectors.iris_dal.IrisDalNewGame(connectors.iris_dal, GAME_ID)
+            await dal.add_new_game_root_data(GAME_ID, "bench game")
+            for field, value in (("slug", "bench-game"), ("summary", "Bench"), ("rating", 50.0)):
+                await dal.add_base_data(field, value)
+            await dal.add_date_data("first_release_date", 946684800)
+            await dal.add_extra_data(
+                "extra_content",
+                [{"id": GAME_ID + i, "name": f"bench similar {i}"} for i in range(1, 21)],
+                "similar_game",
+            )
+            await dal.add_normalized_data(
+                "alternative_name",
+                [{"id": i, "name": f"bench alt {i}", "comment": "Bench"} for i in range(30)],
+            )
+            for field, table, n in (("genre", "game_genre", 3), ("keyword", "game_keyword", 40), ("theme", "game_theme", 5)):
+                await dal.add_association_table_data(
+                    field,
+                    [{"name": f"bench {field} {i}", "slug": f"bench-{field}-{i}"} for i in range(n)],
+                    table,
+                )
+            await dal.finalize_game()
+
+        return (time.perf_counter() - start) * 1000, dal.round_trips
+
+
+async def main():
+    pool = IrisAsyncConnectionPool(min_size=1, max_size=1)
+    await pool.connect_to_iris()
+    await connectors.init_global_pool(pool)
+    await connectors.init_global_iris_dal(IrisDataAccessLayer())
+
+    for pipeline in (False, True):
+        await ingest(pipeline)
+        results = [await ingest(pipeline) for _ in range(N_RUNS)]
+        latencies = sorted(latency for latency, _ in results)
+        print(
+            f"{'pipeline' if pipeline else 'serial':>8} : "
+            f"median {statistics.median(latencies):.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, "
+            f"{results[0][1]} round-trips"
+        )
+
+    await pool.close()
+    os.rmdir(f"/bacchus/media/{GAME_ID}")
+
+
+asyncio.run(main())
+PYTHON
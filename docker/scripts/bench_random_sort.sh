@@ -0,0 +1,46 @@
+#!/bin/bash
+
+# Compare ORDER BY random() with the seeded random key walk on 100k complete games
+# Usage : bash bench_random_sort.sh <container_name> [n_games]
+
+container_name=$1
+n_games=${2:-100000}
+
+# Vérifie si le nom du conteneur a été fourni
+if [ -z "$container_name" ]
+then
+    echo "Le nom du conteneur doit être fourni."
+    exit 1
+fi
+
+# Tout est exécuté dans une transaction annulée, la base n'est pas modifiée
+docker exec -i $container_name psql -U postgres -v ON_ERROR_STOP=1 <<EOF
+BEGIN;
+
+INSERT INTO iris.game (id, name, complete)
+    SELECT 900000000 + i, 'bench game ' || i, true
+    FROM generate_series(1, $n_games) i;
+ANALYZE iris.game;
+
+\echo '---------- ORDER BY random() ----------'
+EXPLAIN (ANALYZE, BUFFERS, TIMING)
+    SELECT g.id, g.name FROM iris.game g
+    WHERE g.complete
+    ORDER BY random()
+    LIMIT 20;
+
+\echo '---------- Seeded random key walk ----------'
+EXPLAIN (ANALYZE, BUFFERS, TIMING)
+    SELECT * FROM (
+        (SELECT g.random_key, g.id, g.name FROM iris.game g
+            WHERE g.complete AND g.random_key < 1 AND (g.random_key, g.id) > (0.42, -1)
+            ORDER BY g.random_key, g.id LIMIT 20)
+        UNION ALL
+        (SELECT g.random_key, g.id, g.name FROM iris.game g
+            WHERE g.complete AND g.random_key < 0.42 AND (g.random_key, g.id) > (-1, -1)
+            ORDER BY g.random_key, g.id LIMIT 20)
+    ) games
+    LIMIT 20;
+
+ROLLBACK;
+EOF
@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# Applique les migrations de docker/conf/db/migrations sur une base existante
+# Usage : bash migrate_db.sh <container_name>
+
+SCRIPTS_DIR=$(dirname "$(realpath "$0")")
+
+container_name=$1
+
+# Vérifie si le nom du conteneur a été fourni
+if [ -z "$container_name" ]
+then
+    echo "Le nom du conteneur doit être fourni."
+    exit 1
+fi
+
+# Les migrations sont idempotentes et appliquées dans l'ordre de leur nom
+for migration in "$SCRIPTS_DIR"/../conf/db/migrations/*.sql
+do
+    echo "Application de la migration $(basename "$migration")"
+    docker exec -i $container_name psql -U postgres -v ON_ERROR_STOP=1 < "$migration" || exit 1
+done
+
+echo "Les migrations ont été appliquées avec succès."
@@ -0,0 +1,185 @@
+import asyncio
+import bisect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from PIL import Image
+
+# Resizes run in worker processes so that they never block the event loop
+RESIZE_WORKERS = int(os.getenv("RESIZE_WORKERS", str(os.cpu_count() or 1)))
+# Resizes running or waiting for a worker before new ones are refused
+RESIZE_MAX_PENDING = int(os.getenv("RESIZE_MAX_PENDING", str(RESIZE_WORKERS * 4)))
+
+# Latency histogram buckets (ms) and size classes (largest requested dimension)
+RESIZE_LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+RESIZE_SIZE_CLASSES = [("small", 256), ("medium", 640), ("large", 1280)]
+
+
+class ResizePoolSaturated(Exception):
+    """Exception raised when too many resizes are already pending.
+
+    Attributes:
+        message -- explanation of the error
+    """
+
+    def __init__(self, message="Too many pending image resizes"):
+        self.message = message
+        super().__init__(self.message)
+
+
+def resize_image(file_path: str, cached_file_path: str, width: int, height: int) -> None:
+    """Resize an image keeping its aspect ratio and save it. Runs in the resize pool.
+        If both dimensions are provided, the image is resized to fit in them,
+        if only one is provided, the other one is calculated from the aspect ratio.
+
+    Args:
+        file_path (str): Original image path
+        cached_file_path (str): Resized image path, its extension sets the format
+        width (int): Requested width, 0 if not provided
+        height (int): Requested height, 0 if not provided
+    """
+    with Image.open(file_path) as img:
+        aspect_ratio = img.size[0] / img.size[1]
+
+        if width and height:
+            # Keep aspect ratio by resizing to fit in the provided dimensions
+            if width / aspect_ratio < height:
+                size = (width, int(width / aspect_ratio))
+            else:
+                size = (int(height * aspect_ratio), height)
+        elif width:
+            size = (width, int(width / aspect_ratio))
+        else:
+            size = (int(height * aspect_ratio), height)
+
+        # Written next to its destination then renamed, readers never see a partial file.
+        # The temporary name keeps the extension, which sets the format.
+        os.makedirs(os.path.dirname(cached_file_path), exist_ok=True)
+        root, ext = os.path.splitext(cached_file_path)
+        tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+        try:
+            img.resize(size, Image.Resampling.LANCZOS).save(tmp_path, optimize=True)
+            os.replace(tmp_path, cached_file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def size_class(width: int, height: int) -> str:
+    largest = max(width, height)
+    for name, limit in RESIZE_SIZE_CLASSES:
+        if largest <= limit:
+            return name
+    return "xlarge"
+
+
+class ResizePool:
+    """Bounded process pool for image resizes, with per size class latency histograms.
+    Concurrent requests for the same resized image share a single resize.
+    """
+
+    def __init__(
+        self, workers: int = RESIZE_WORKERS, max_pending: int = RESIZE_MAX_PENDING
+    ) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor: ProcessPoolExecutor | None = None
+        # Running resizes by resized image path
+        self.in_flight: dict[str, asyncio.Task] = {}
+        self.rejected = 0
+        self.deduplicated = 0
+        self.histograms = {
+            name: [0] * (len(RESIZE_LATENCY_BUCKETS) + 1)
+            for name in [name for name, _ in RESIZE_SIZE_CLASSES] + ["xlarge"]
+        }
+
+    async def resize(
+        self, file_path: str, cached_file_path: str, width: int, height: int
+    ) -> None:
+        """Resize an image in a worker process, or wait for the running resize
+            of the same image
+
+        Args:
+            file_path (str): Original image path
+            cached_file_path (str): Resized image path
+            width (int): Requested width, 0 if not provided
+            height (int): Requested height, 0 if not provided
+
+        Raises:
+            ResizePoolSaturated: max_pending resizes are already running or queued
+        """
+        task = self.in_flight.get(cached_file_path)
+        if task is not None:
+            self.deduplicated += 1
+            await asyncio.shield(task)
+            return
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ResizePoolSaturated()
+
+        # Counted right away so that the next requests see it before the task starts
+        self.pending += 1
+        task = asyncio.ensure_future(
+            self.run(file_path, cached_file_path, width, height)
+        )
+        self.in_flight[cached_file_path] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(cached_file_path, None))
+
+        # A client disconnecting must not cancel the resize awaited by the others
+        await asyncio.shield(task)
+
+    async def run(
+        self, file_path: str, cached_file_path: str, width: int, height: int
+    ) -> None:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self.executor,
+                partial(resize_image, file_path, cached_file_path, width, height),
+            )
+        finally:
+            self.pending -= 1
+
+        elapsed = (time.perf_counter() - start) * 1000
+        bucket = bisect.bisect_left(RESIZE_LATENCY_BUCKETS, elapsed)
+        self.histograms[size_class(width, height)][bucket] += 1
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def get_stats(self) -> dict:
+        """Get the pool usage and the resize latency histograms
+
+        Returns:
+            dict: Pending, rejected and deduplicated resizes, and count of resizes by size
+                class and latency bucket ("<=N" ms)
+        """
+        labels = [f"<={bucket}" for bucket in RESIZE_LATENCY_BUCKETS] + [
+            f">{RESIZE_LATENCY_BUCKETS[-1]}"
+        ]
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "deduplicated": self.deduplicated,
+            "latency_ms": {
+                name: dict(zip(labels, counts))
+                for name, counts in self.histograms.items()
+            },
+        }
+
+
+resize_pool = ResizePool()
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+
+MEDIA_CACHE_DIR = "/bacchus/media/cache"
+# Byte budget of the resized images, eviction brings it back under MEDIA_CACHE_LOW_WATERMARK of it
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(2 * 1024**3)))
+MEDIA_CACHE_LOW_WATERMARK = 0.9
+# Seconds between two eviction / index snapshot rounds
+MEDIA_CACHE_INTERVAL = int(os.getenv("MEDIA_CACHE_INTERVAL", "60"))
+MEDIA_CACHE_INDEX = "index.json"
+
+
+class MediaCache:
+    """Persistent cache of the resized images, stored by game under the cache
+    directory and bounded by a byte budget.
+    Access times are kept in an in-memory LRU index, snapshotted to disk so that
+    the eviction order survives restarts.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = MEDIA_CACHE_DIR,
+        max_bytes: int = MEDIA_CACHE_MAX_BYTES,
+        interval: int = MEDIA_CACHE_INTERVAL,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.index_path = os.path.join(cache_dir, MEDIA_CACHE_INDEX)
+        # Relative path -> (last access time, size), least recently used first
+        self.entries: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self.size = 0
+        self.dirty = False
+        self.evicted = 0
+        self.task: asyncio.Task | None = None
+
+    def get_path(self, game_id: int, name: str) -> str:
+        """Get the path of a resized image
+
+        Args:
+            game_id (int): Game ID
+            name (str): Resized image file name
+
+        Raises:
+            ValueError: The path resolves outside of the cache directory
+
+        Returns:
+            str: Resized image path
+        """
+        path = os.path.join(self.cache_dir, str(game_id), name)
+        if not self.contains(path):
+            raise ValueError(f"Resized image path [{path}] is outside of the media cache")
+        return path
+
+    def contains(self, path: str) -> bool:
+        """Check that a path resolves inside of the cache directory
+
+        Args:
+            path (str): Path to check
+
+        Returns:
+            bool: True if the path is under the cache directory
+        """
+        cache_dir = os.path.realpath(self.cache_dir)
+        return os.path.commonpath([cache_dir, os.path.realpath(path)]) == cache_dir
+
+    def relative(self, path: str) -> str:
+        return os.path.relpath(path, self.cache_dir)
+
+    def load(self) -> None:
+        """Rebuild the index from the cache directory, ordered by the access times
+        of the last snapshot (modification time for files missing from it)
+        """
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                access_times = json.load(f)
+        except (OSError, ValueError):
+            access_times = {}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                rel_path = self.relative(path)
+                if rel_path == MEDIA_CACHE_INDEX:
+                    continue
+
+                # Resizes interrupted by a stop, and files of the former flat layout
+                if ".tmp." in name or root == self.cache_dir:
+                    os.remove(path)
+                    continue
+
+                stat = os.stat(path)
+                entries.append((access_times.get(rel_path, stat.st_mtime), rel_path, stat.st_size))
+
+        self.entries = OrderedDict(
+            (rel_path, (access_time, size)) for access_time, rel_path, size in sorted(entries)
+        )
+        self.size = sum(size for _, size in self.entries.values())
+        logging.info(
+            "Media cache loaded: %s files, %s bytes", len(self.entries), self.size
+        )
+
+    def touch(self, path: str) -> None:
+        """Mark a resized image as most recently used
+
+        Args:
+            path (str): Resized image path
+        """
+        rel_path = self.relative(path)
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return
+
+        self.entries[rel_path] = (time.time(), entry[1])
+        self.entries.move_to_end(rel_path)
+        self.dirty = True
+
+    def add(self, path: str) -> None:
+        """Register a new resized image
+
+        Args:
+            path (str): Resized image path
+        """
+        # Indexed files are removed on eviction, they must stay in the cache
+        if not self.contains(path):
+            logging.warning("Refusing to index [%s], outside of the media cache", path)
+            return
+
+        rel_path = self.relative(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        previous = self.entries.pop(rel_path, None)
+        if previous is not None:
+            self.size -= previous[1]
+
+        self.entries[rel_path] = (time.time(), size)
+        self.size += size
+        self.dirty = True
+
+    def remove(self, rel_path: str) -> None:
+        _, size = self.entries.pop(rel_path)
+        self.size -= size
+        path = os.path.join(self.cache_dir, rel_path)
+        if not self.contains(path):
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """Remove the least recently used images until the cache is under its
+            low watermark
+
+        Returns:
+            int: Number of images removed
+        """
+        if self.size <= self.max_bytes:
+            return 0
+
+        target = self.max_bytes * MEDIA_CACHE_LOW_WATERMARK
+        removed = 0
+        while self.entries and self.size > target:
+            self.remove(next(iter(self.entries)))
+            removed += 1
+
+        self.evicted += removed
+        self.dirty = True
+        logging.info("Media cache eviction: %s files removed, %s bytes left", removed, self.size)
+        return removed
+
+    def purge_game(self, game_id: int) -> int:
+        """Remove every resized image of a game
+
+        Args:
+            game_id (int): Game ID
+
+        Returns:
+            int: Number of images removed
+        """
+        # The ID ends up in a removed path
+        if not str(game_id).isdigit():
+            return 0
+
+        prefix = f"{game_id}{os.sep}"
+        rel_paths = [rel_path for rel_path in self.entries if rel_path.startswith(prefix)]
+        for rel_path in rel_paths:
+            self.remove(rel_path)
+
+        shutil.rmtree(os.path.join(self.cache_dir, str(game_id)), ignore_errors=True)
+        self.dirty = True
+        return len(rel_paths)
+
+    def snapshot(self) -> None:
+        """Write the access times of the index to disk"""
+        if not self.dirty:
+            return
+
+        access_times = {rel_path: entry[0] for rel_path, entry in self.entries.items()}
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(access_times, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+    async def maintain(self) -> None:
+        """Evict and snapshot the index periodically"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.evict()
+                self.snapshot()
+            except OSError as exc:
+                logging.error("Error while maintaining the media cache: %s", exc)
+
+    async def start(self) -> None:
+        """Load the index and start the background maintenance"""
+        await asyncio.to_thread(self.load)
+        self.evict()
+        self.task = asyncio.create_task(self.maintain())
+
+    async def stop(self) -> None:
+        """Stop the background maintenance and snapshot the index"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        self.snapshot()
+
+    def get_stats(self) -> dict:
+        return {
+            "files": len(self.entries),
+            "size_bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+        }
+
+
+media_cache = MediaCache()
@@ -3,7 +3,6 @@ import glob
 import logging
 import os
 from contextlib import asynccontextmanager
-from PIL import Image
 
 from fastapi import FastAPI, Path, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
@@ -13,6 +12,8 @@ from fastapi.staticfiles import StaticFiles
 
 from app.internal.iris_db_connection import IrisAsyncConnection
 from app.internal.utilities.auth import require_valid_token
+from app.internal.utilities.images import resize_pool, ResizePoolSaturated
+from app.internal.utilities.media_cache import media_cache
 
 from dotenv import load_dotenv
 
@@ -27,6 +28,9 @@ logging.basicConfig(
 
 IRIS_CONN = None
 
+# When the resize pool is saturated: serve the "original" image or answer "503"
+RESIZE_SATURATED_FALLBACK = os.getenv("RESIZE_SATURATED_FALLBACK", "original")
+
 
 @asynccontextmanager
 async def get_iris_conn(app: FastAPI):  # pylint: disable=unused-argument
@@ -48,7 +52,19 @@ async def get_iris_conn(app: FastAPI):  # pylint: disable=unused-argument
     await conn.close()
 
 
-triton = FastAPI()
+@asynccontextmanager
+async def init_media_cache(app: FastAPI):  # pylint: disable=unused-argument
+    """Load the resized images cache index and start its maintenance"""
+
+    await media_cache.start()
+
+    yield  # All the code after this line is executed after the app is closed
+
+    await media_cache.stop()
+    resize_pool.shutdown()
+
+
+triton = FastAPI(lifespan=init_media_cache)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 origins = ["*"]
 triton.add_middleware(
@@ -66,20 +82,25 @@ validation_cat = {
     "cover": "c",
 }
 validation_qual = {"big": "b", "med": "m", "huge": "h", "small": "s"}
+# Formats a resized image can be requested in, the extension sets the Pillow encoder
+validation_format = {"jpg", "jpeg", "png", "webp"}
 
 # Mount static files from bacchus
 triton.mount("/static", StaticFiles(directory="/bacchus/audio/"), name="static")
 
-# Empty media cache folder
-for f in glob.glob("/bacchus/media/cache/*"):
-    os.remove(f)
-
 @triton.get("/health")
 async def health_check():
     """ Health check endpoint for docker compose """
     return {"status": "healthy"}
 
 
+@triton.get("/health/resize")
+@require_valid_token
+async def resize_metrics(request: Request):
+    """ Image resize pool usage, latency histograms by size class and resized images cache usage """
+    return {**resize_pool.get_stats(), "cache": media_cache.get_stats()}
+
+
 @triton.get("/audio/{game_id}/{album_id}/{track_id}/{filename}")
 async def read_video(
     game_id: int, album_id: str, track_id: int, filename: str
@@ -127,55 +148,48 @@ async def read_media(
     # Cache file for 6 months
     headers = {"Cache-Control": "public, max-age=15552000"}
 
+    # The format and dimensions end up in the resized image path
+    format = format.lower()
+    if format not in validation_format or width < 0 or height < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid media resize parameters",
+        )
+
     format_cat = validation_cat.get(cat)
     if format_cat:
         format_qual = validation_qual.get(qual)
         if format_qual:
             file_path = f"/bacchus/media/{game_id}/{format_cat}_{format_qual}_{filehash}.jpg"
             if exists(file_path):
+                if not width and not height:
+                    return FileResponse(file_path, headers=headers)
+
                 # Check if resized cached file exists
-                cached_file_path = f"/bacchus/media/cache/{format_cat}_{format_qual}_{filehash}_{width}_{height}.{format}"
-                if width and height:
-                    if exists(cached_file_path):
-                        return FileResponse(cached_file_path, headers=headers)
-                
-                # Resize image if needed and cache it
-                # resize needs to keep the aspect ratio of the original image
-                # if only one dimension is provided, the other one is calculated to keep the aspect ratio
-                # if both dimensions are provided, the image is resized to fit in the provided dimensions
-                
-                if width and height:
-                    # Keep aspect ratio by resizing to fit in the provided dimensions
-                    img = Image.open(file_path)
-                    aspect_ratio = img.size[0] / img.size[1]
-                    if width / aspect_ratio < height:
-                        img = img.resize((width, int(width / aspect_ratio)), Image.Resampling.LANCZOS)
-                    else:
-                        img = img.resize((int(height * aspect_ratio), height), Image.Resampling.LANCZOS)
-                    img.save(cached_file_path, optimize=True)
-                    
-                elif width:
-                    # Only width is provided
-                    img = Image.open(file_path)
-                    wpercent = (width / float(img.size[0]))
-                    hsize = int((float(img.size[1]) * float(wpercent)))
-                    img = img.resize((width, hsize), Image.Resampling.LANCZOS)
-                    img.save(cached_file_path, optimize=True)
-                    
-                elif height:
-                    # Only height is provided
-                    img = Image.open(file_path)
-                    hpercent = (height / float(img.size[1]))
-                    wsize = int((float(img.size[0]) * float(hpercent)))
-                    img = img.resize((wsize, height), Image.Resampling.LANCZOS)
-                    img.save(cached_file_path, optimize=True)
-                
-                else:
-                    # No dimensions provided
-                    cached_file_path = file_path
-                    
+                cached_file_path = media_cache.get_path(
+                    game_id, f"{format_cat}_{format_qual}_{filehash}_{width}_{height}.{format}"
+                )
+                if exists(cached_file_path):
+                    media_cache.touch(cached_file_path)
+                    return FileResponse(cached_file_path, headers=headers)
+
+                # Resize image keeping its aspect ratio and cache it
+                try:
+                    await resize_pool.resize(file_path, cached_file_path, width, height)
+                except ResizePoolSaturated:
+                    logging.warning("Resize pool saturated, [%s] not resized", cached_file_path)
+                    if RESIZE_SATURATED_FALLBACK == "503":
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many pending image resizes",
+                            headers={"Retry-After": "1"},
+                        )
+                    # The browser must not keep the original in place of the resized image
+                    return FileResponse(file_path, headers={"Cache-Control": "no-store"})
+
+                media_cache.add(cached_file_path)
                 return FileResponse(cached_file_path, headers=headers)
-                
+
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Media resource not found",
@@ -201,4 +215,6 @@ async def delete_media(request: Request, game_id: str) -> dict:
             os.remove(f)
             nfile += 1
 
+        nfile += media_cache.purge_game(game_id)
+
     return {"file_removed": nfile}